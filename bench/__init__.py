@@ -0,0 +1 @@
+# bench/ → Benchmark + load-test harness (fake Docker, fake interactions) 📊
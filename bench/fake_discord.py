@@ -0,0 +1,72 @@
+# bench/fake_discord.py → Minimal stand-ins for discord.Interaction 🎭
+import time
+from typing import Any, Dict, List, Optional
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str):
+        self.id = user_id
+        self.name = name
+        self.mention = f"<@{user_id}>"
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _ack(self, kind: str, **kwargs):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+        self._interaction.record(kind, **kwargs)
+
+    async def defer(self, ephemeral: bool = False, thinking: bool = False):
+        self._ack("defer", ephemeral=ephemeral)
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        self._ack("send_message", content=content, **kwargs)
+
+    async def edit_message(self, **kwargs):
+        self._ack("edit_message", **kwargs)
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self._interaction.record("followup", content=content, **kwargs)
+
+class FakeInteraction:
+    """Records every response so benchmarks can time ack / final reply"""
+
+    def __init__(self, client: Any, user: FakeUser):
+        self.client = client
+        self.user = user
+        self.extras: Dict[str, Any] = {}
+        self.created = time.perf_counter()
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.events: List[tuple] = []
+
+    def record(self, kind: str, **kwargs):
+        self.events.append((kind, time.perf_counter() - self.created, kwargs))
+
+    async def edit_original_response(self, **kwargs):
+        self.record("edit_original", **kwargs)
+
+    @property
+    def ack_latency(self) -> Optional[float]:
+        return self.events[0][1] if self.events else None
+
+    @property
+    def reply_latency(self) -> Optional[float]:
+        return self.events[-1][1] if self.events else None
+
+class FakeBot:
+    """Carries the attributes the cogs read off `self.bot`"""
+
+    def __init__(self, vps_manager, embed_cache):
+        self.vps_manager = vps_manager
+        self.embed_cache = embed_cache
@@ -0,0 +1,225 @@
+# bench/fake_docker.py → In-process fake Docker daemon for benchmarks 🐳
+import itertools
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+class FakeDockerError(Exception):
+    """Injected failure (stands in for docker.errors.APIError)"""
+
+class NotFound(FakeDockerError):
+    pass
+
+class FakeDaemon:
+    """Shared state + latency / failure injection for every fake call.
+
+    Calls block with time.sleep() just like the real SDK, so they exercise the
+    same worker-thread path VPSManager uses in production.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.containers: Dict[str, "FakeContainer"] = {}
+        self.images: Dict[str, "FakeImage"] = {}
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._ports = itertools.count(40000)
+
+    def call(self, name: str):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            fail = self.failure_rate and self.rng.random() < self.failure_rate
+            delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeDockerError(f"injected failure in {name}")
+
+    def next_id(self) -> str:
+        return f"{next(self._ids):064x}"
+
+class FakeContainer:
+    def __init__(self, daemon: FakeDaemon, name: str, labels: Dict[str, str], ports: Optional[Dict] = None, image: str = ""):
+        self.daemon = daemon
+        self.id = daemon.next_id()
+        self.name = name
+        self.image = image
+        self.labels = labels
+        self.status = "running"
+        host_ports = {}
+        for spec, host_port in (ports or {}).items():
+            host_ports[spec] = [{"HostIp": "0.0.0.0", "HostPort": str(host_port or next(daemon._ports))}]
+        self.attrs = {"NetworkSettings": {"Ports": host_ports}, "State": {"Pid": 0}}
+        self._cpu = 0
+        # Last container.update() kwargs, for checking upgrades
+        self.resources: Dict[str, object] = {}
+        # Logged-in ssh users / attached tmate clients the idle probe should see
+        self.ssh_sessions = 0
+        self.tmate_clients = 0
+        # Containers from the old ubuntu:22.04 image have no procps
+        self.has_pgrep = True
+
+    def processes(self, exec_cmdline: str) -> List[str]:
+        """Command lines pgrep would see while `exec_cmdline` runs"""
+        return (["/sbin/init", "/usr/sbin/sshd -D"]
+                + [f"sshd: root@pts/{i}" for i in range(self.ssh_sessions)]
+                + [exec_cmdline])
+
+    def start(self):
+        self.daemon.call("container.start")
+        self.status = "running"
+
+    def stop(self, timeout: int = 10):
+        self.daemon.call("container.stop")
+        self.status = "exited"
+
+    def restart(self, timeout: int = 10):
+        self.daemon.call("container.restart")
+        self.status = "running"
+
+    def reload(self):
+        self.daemon.call("container.reload")
+
+    def update(self, **kwargs):
+        self.daemon.call("container.update")
+        self.resources = kwargs
+        return {"Warnings": []}
+
+    def exec_run(self, cmd, **kwargs):
+        self.daemon.call("container.exec_run")
+        script = cmd[-1] if isinstance(cmd, list) else cmd
+        if "tmate_ssh" in script:
+            # tmate display -p '#{tmate_ssh}' after wait tmate-ready
+            return 0, f"ssh bench{abs(hash(self.id + str(time.monotonic()))) % 10**8}@lon1.tmate.io\n".encode()
+        if "tmate_num_clients" in script:
+            # Session probe: evaluate its pgrep pattern against the process
+            # table, which includes the probe's own `sh -c` line like on a real host
+            if "command -v pgrep" in script and not self.has_pgrep:
+                return 3, b""
+            cmdline = " ".join(cmd) if isinstance(cmd, list) else cmd
+            pattern = re.search(r"pgrep -c -f '([^']*)'", script)
+            sessions = sum(1 for line in self.processes(cmdline) if re.search(pattern.group(1), line)) if pattern else 0
+            return 0, f"{sessions} {self.tmate_clients}\n".encode()
+        return 0, b""
+
+    def remove(self, force: bool = False):
+        self.daemon.call("container.remove")
+        with self.daemon.lock:
+            self.daemon.containers.pop(self.name, None)
+
+    def stats(self, stream: bool = False):
+        self.daemon.call("container.stats")
+        self._cpu += 1_000_000
+        return {
+            "cpu_stats": {
+                "cpu_usage": {"total_usage": self._cpu + 500_000, "percpu_usage": [0, 0]},
+                "system_cpu_usage": 100_000_000 + self._cpu * 10,
+                "online_cpus": 2,
+            },
+            "precpu_stats": {
+                "cpu_usage": {"total_usage": self._cpu},
+                "system_cpu_usage": 100_000_000 + self._cpu * 10 - 10_000_000,
+            },
+            "memory_stats": {"usage": 256 * 1024 * 1024, "limit": 1024 * 1024 * 1024},
+            "networks": {"eth0": {"rx_bytes": self._cpu // 100, "tx_bytes": self._cpu // 200}},
+            "blkio_stats": {"io_service_bytes_recursive": [
+                {"op": "read", "value": self._cpu // 50},
+                {"op": "write", "value": self._cpu // 80},
+            ]},
+        }
+
+class FakeContainers:
+    def __init__(self, daemon: FakeDaemon):
+        self.daemon = daemon
+
+    def run(self, image: str, name: Optional[str] = None, labels: Optional[Dict[str, str]] = None, ports: Optional[Dict] = None, **kwargs):
+        self.daemon.call("containers.run")
+        with self.daemon.lock:
+            if name in self.daemon.containers:
+                raise FakeDockerError(f"Conflict. The container name {name} is already in use")
+            container = FakeContainer(self.daemon, name, labels or {}, ports, image)
+            self.daemon.containers[name] = container
+        return container
+
+    def get(self, name: str) -> FakeContainer:
+        self.daemon.call("containers.get")
+        container = self.daemon.containers.get(name)
+        if container is None:
+            raise NotFound(f"No such container: {name}")
+        return container
+
+    def list(self, all: bool = False, filters: Optional[Dict] = None) -> List[FakeContainer]:
+        self.daemon.call("containers.list")
+        with self.daemon.lock:
+            containers = list(self.daemon.containers.values())
+        if not all:
+            containers = [c for c in containers if c.status == "running"]
+        label = (filters or {}).get("label")
+        if label:
+            containers = [c for c in containers if label in c.labels]
+        return containers
+
+class FakeImage:
+    def __init__(self, daemon: FakeDaemon, tags: List[str], repo_digests: Optional[List[str]] = None):
+        self.id = f"sha256:{daemon.next_id()}"
+        self.tags = tags
+        self.labels: Dict[str, str] = {}
+        self.attrs = {"RepoDigests": repo_digests or [], "Size": 512 * 1024 * 1024, "Created": "2024-01-01T00:00:00Z"}
+
+class FakeImages:
+    def __init__(self, daemon: FakeDaemon):
+        self.daemon = daemon
+
+    def get(self, name: str) -> FakeImage:
+        self.daemon.call("images.get")
+        for image in self.daemon.images.values():
+            if name == image.id or name in image.tags or name in image.attrs["RepoDigests"]:
+                return image
+        raise NotFound(f"No such image: {name}")
+
+    def pull(self, repository: str, tag: Optional[str] = None, **kwargs) -> FakeImage:
+        self.daemon.call("images.pull")
+        if "@" in repository:
+            # By digest: the registry serves exactly that content, untagged
+            image = FakeImage(self.daemon, [], [repository])
+        else:
+            ref = f"{repository}:{tag}" if tag else repository
+            image = FakeImage(self.daemon, [ref], [f"{ref.rsplit(':', 1)[0]}@sha256:{self.daemon.next_id()}"])
+        with self.daemon.lock:
+            self.daemon.images[image.id] = image
+        return image
+
+    def list(self, name: Optional[str] = None, all: bool = False, filters: Optional[Dict] = None) -> List[FakeImage]:
+        self.daemon.call("images.list")
+        return list(self.daemon.images.values())
+
+    def prune(self, filters: Optional[Dict] = None):
+        self.daemon.call("images.prune")
+        return {"ImagesDeleted": None, "SpaceReclaimed": 0}
+
+    def remove(self, image: str, force: bool = False, noprune: bool = False):
+        self.daemon.call("images.remove")
+        with self.daemon.lock:
+            self.daemon.images.pop(image, None)
+
+class FakeDockerClient:
+    """Drop-in for docker.DockerClient as far as VPSManager is concerned"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.daemon = FakeDaemon(latency, jitter, failure_rate, seed)
+        self.containers = FakeContainers(self.daemon)
+        self.images = FakeImages(self.daemon)
+
+    def ping(self) -> bool:
+        self.daemon.call("ping")
+        return True
+
+    def info(self) -> Dict[str, str]:
+        self.daemon.call("info")
+        return {"DockerRootDir": "/var/lib/docker"}
@@ -0,0 +1,323 @@
+# bench/run_bench.py → Reproducible VPSManager / cog load benchmarks 📊
+"""Drive VPSManager and the cog handlers against an in-process fake Docker
+daemon and fake interactions, then emit JSON results.
+
+    python -m bench.run_bench --sizes 10 100 1000 10000 --out bench.json
+    python -m bench.run_bench --baseline bench.json   # exit 1 on p99 regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fake_docker import FakeContainer, FakeDockerClient
+from bench.fake_discord import FakeBot, FakeInteraction, FakeUser
+from idle_reclaim import IdleReclaimer
+from image_manager import ImageManager
+from vps_manager import VPSManager
+
+SCENARIOS = ("create", "lifecycle", "stats", "backup", "state_save", "idle", "images", "upgrade", "handlers")
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+def summarize(scenario: str, size: int, latencies: List[float], errors: int, elapsed: float, **extra) -> Dict[str, Any]:
+    ops = len(latencies)
+    return {
+        "scenario": scenario,
+        "size": size,
+        "ops": ops,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_ops_s": round(ops / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        **extra,
+    }
+
+async def run_ops(count: int, concurrency: int, op: Callable[[int], Awaitable[Any]]):
+    """Run op(i) for i in range(count) with bounded concurrency; returns (latencies, errors, elapsed)"""
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                result = await op(i)
+                if result is False:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return latencies, errors, time.perf_counter() - t0
+
+# Seeded instances take BASE_PORT + i; make_manager sizes the range so creates never run out
+BASE_PORT = 10000
+
+def populate(manager: VPSManager, client: FakeDockerClient, size: int, per_user: int):
+    """Seed `size` instances straight into the registry and fake daemon (no latency)"""
+    plane_ids = list(manager.planes) or ["1"]
+    instances = {}
+    for i in range(size):
+        hostname = f"bench{i}-vps"
+        user_id = str(100000 + i // per_user)
+        container_name = f"vps-{hostname}"
+        labels = {"vps.user_id": user_id, "vps.hostname": hostname, "vps.plane": plane_ids[i % len(plane_ids)]}
+        container = FakeContainer(client.daemon, container_name, labels, {"22/tcp": BASE_PORT + i})
+        client.daemon.containers[container_name] = container
+        instances[hostname] = {
+            "user_id": user_id,
+            "username": f"bench{i}",
+            "hostname": hostname,
+            "container_id": container.id,
+            "container_name": container_name,
+            "ssh_port": str(BASE_PORT + i),
+            "tmate_session": f"ssh bench{i}@lon1.tmate.io",
+            "plane": labels["vps.plane"],
+            "status": "running",
+            "created_at": datetime.utcnow().isoformat(),
+            "last_backup": None,
+            "suspended": False,
+        }
+    manager.vps_instances = instances
+
+def make_manager(args, workdir: str, size: int):
+    client = FakeDockerClient(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=args.seed)
+    manager = VPSManager(
+        client=client,
+        vps_data_file=os.path.join(workdir, f"vps_instances_{size}.json"),
+        journal_file=os.path.join(workdir, f"vps_journal_{size}.jsonl"),
+        # Seeded ports stay under half the range, so creates neither run out
+        # nor trip the allocator's high-usage warning
+        port_range=(BASE_PORT, BASE_PORT + 2 * size + args.sample + 1000)
+    )
+    manager.boot_wait = 0
+    manager.backup_delay = 0
+    manager.restore_delay = 0
+    populate(manager, client, size, args.per_user)
+    return manager, client
+
+async def bench_size(args, size: int, workdir: str) -> List[Dict[str, Any]]:
+    results = []
+    sample = min(size, args.sample)
+    hosts = [f"bench{i}-vps" for i in range(sample)]
+
+    if "create" in args.scenarios:
+        manager, _ = make_manager(args, workdir, size)
+        lat, err, el = await run_ops(sample, args.concurrency, lambda i: manager.create_vps(str(900000 + i), f"new{i}", "1"))
+        results.append(summarize("create", size, lat, err, el))
+
+    if "lifecycle" in args.scenarios:
+        manager, _ = make_manager(args, workdir, size)
+        ops = (manager.stop_vps, manager.start_vps, manager.restart_vps)
+        lat, err, el = await run_ops(sample * len(ops), args.concurrency,
+                                     lambda i: ops[i % len(ops)](hosts[i // len(ops)]))
+        results.append(summarize("lifecycle", size, lat, err, el))
+
+    if "stats" in args.scenarios:
+        manager, _ = make_manager(args, workdir, size)
+        lat, err, el = await run_ops(sample, args.concurrency, lambda i: manager.get_resource_usage(hosts[i]))
+        t0 = time.perf_counter()
+        sampled = await manager.sample_metrics()
+        sweep = time.perf_counter() - t0
+        results.append(summarize("stats", size, lat, err, el, full_sweep_s=round(sweep, 4), full_sweep_hosts=sampled))
+
+    if "backup" in args.scenarios:
+        manager, _ = make_manager(args, workdir, size)
+        lat, err, el = await run_ops(sample, args.concurrency, lambda i: manager.create_backup(hosts[i]))
+        results.append(summarize("backup", size, lat, err, el))
+
+    if "state_save" in args.scenarios:
+        manager, _ = make_manager(args, workdir, size)
+        rounds = max(3, min(50, 50_000 // max(size, 1)))
+
+        async def save(_):
+            manager.save_vps_data()
+
+        lat, err, el = await run_ops(rounds, 1, save)
+        results.append(summarize("state_save", size, lat, err, el, file_bytes=os.path.getsize(manager.vps_data_file)))
+
+    if "idle" in args.scenarios:
+        manager, client = make_manager(args, workdir, size)
+        # Every third host has someone on ssh, every fifth a tmate client and
+        # every seventh lacks pgrep (unknown); the probe must report exactly
+        # that and the reclaimer stop only hosts known to be empty
+        expected = {}
+        for i, hostname in enumerate(hosts):
+            container = client.daemon.containers[f"vps-{hostname}"]
+            container.ssh_sessions = 1 if i % 3 == 0 else 0
+            container.tmate_clients = 1 if i % 5 == 0 else 0
+            container.has_pgrep = i % 7 != 6
+            expected[hostname] = container.ssh_sessions + container.tmate_clients if container.has_pgrep else None
+            manager.metrics_history[hostname] = [(time.time() - 3600, 0.0, 0)]
+
+        async def probe(i):
+            return await manager.count_active_sessions(hosts[i]) == expected[hosts[i]]
+
+        lat, err, el = await run_ops(sample, args.concurrency, probe)
+        reclaimer = IdleReclaimer(manager, {"default_minutes": 1, "max_per_run": sample})
+        for hostname in list(manager.vps_instances)[sample:]:
+            manager.vps_instances[hostname]['status'] = 'stopped'
+        outcome = await reclaimer.run_once()
+        if outcome["hibernated"] != sum(1 for n in expected.values() if n == 0):
+            err += 1
+        results.append(summarize("idle", size, lat, err, el, hibernated=outcome["hibernated"]))
+
+    if "images" in args.scenarios:
+        manager, client = make_manager(args, workdir, size)
+        # Pin every plane: ensure_images pulls by digest, creates must use repo@digest
+        for plane in manager.planes.values():
+            plane['image_digest'] = f"sha256:{'ab' * 32}"
+        images = ImageManager(manager, {"state_file": os.path.join(workdir, f"image_state_{size}.json")})
+        ensured = await images.ensure_images()
+
+        async def create_pinned(i):
+            vps = await manager.create_vps(str(900000 + i), f"pin{i}", "1")
+            return client.daemon.containers[vps['container_name']].image == manager.image_for_plane("1")
+
+        lat, err, el = await run_ops(sample, args.concurrency, create_pinned)
+        err += sum(1 for status in ensured.values() if status != "ok")
+        results.append(summarize("images", size, lat, err, el, planes=len(ensured)))
+
+    if "upgrade" in args.scenarios:
+        manager, client = make_manager(args, workdir, size)
+        target = list(manager.planes)[-1]
+        ram = float(manager.planes[target]['ram'].replace('GB', ''))
+
+        async def upgrade(i):
+            if not await manager.upgrade_vps(hosts[i], target):
+                return False
+            # Upgrades must keep create's memory+swap rule (twice the memory limit)
+            resources = client.daemon.containers[f"vps-{hosts[i]}"].resources
+            return resources.get('memswap_limit') == f"{ram * 2:g}g"
+
+        lat, err, el = await run_ops(sample, args.concurrency, upgrade)
+        results.append(summarize("upgrade", size, lat, err, el))
+
+    if "handlers" in args.scenarios:
+        results.extend(await bench_handlers(args, size, workdir, sample))
+
+    return results
+
+async def bench_handlers(args, size: int, workdir: str, sample: int) -> List[Dict[str, Any]]:
+    try:
+        from cogs.user_cmds import UserCommands
+        from cogs.utils import EmbedCache
+    except ImportError as e:
+        return [{"scenario": "handlers", "size": size, "skipped": f"cogs unavailable: {e}"}]
+
+    manager, _ = make_manager(args, workdir, size)
+    with open(os.path.join(ROOT, 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    bot = FakeBot(manager, EmbedCache(config))
+    cog = UserCommands(bot)
+    users = [FakeUser(100000 + i, f"bench{i * args.per_user}") for i in range(max(1, sample // args.per_user))]
+
+    results = []
+    for name, command in (("myvps", UserCommands.myvps), ("usage", UserCommands.usage), ("plane", UserCommands.plane)):
+        interactions = []
+
+        async def invoke(i):
+            interaction = FakeInteraction(bot, users[i % len(users)])
+            interactions.append(interaction)
+            await command.callback(cog, interaction)
+
+        lat, err, el = await run_ops(sample, args.concurrency, invoke)
+        acks = [it.ack_latency for it in interactions if it.ack_latency is not None]
+        results.append(summarize(
+            f"handler:{name}", size, lat, err, el,
+            ack_p99_ms=round(percentile(acks, 0.99) * 1000, 3),
+        ))
+    return results
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r["scenario"], r["size"]): r for r in json.load(f)["results"] if "p99_ms" in r}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["scenario"], r["size"]))
+        if not old or "p99_ms" not in r:
+            continue
+        # Ignore sub-millisecond noise
+        if r["p99_ms"] > max(old["p99_ms"] * (1 + tolerance), old["p99_ms"] + 1.0):
+            regressions.append(f'{r["scenario"]}@{r["size"]}: p99 {old["p99_ms"]}ms -> {r["p99_ms"]}ms')
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="nxh-i7 VPSManager / cog benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--sample", type=int, default=200, help="operations measured per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-user", type=int, default=5, help="instances owned by each fake user")
+    parser.add_argument("--latency", type=float, default=0.002, help="fake Docker per-call latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON results to compare p99 against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    return parser.parse_args(argv)
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.chdir(ROOT)  # VPSManager / cogs read ./config.json
+    workdir = tempfile.mkdtemp(prefix="nxh-bench-")
+    try:
+        results = []
+        for size in args.sizes:
+            results.extend(await bench_size(args, size, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    status = 0
+    if not args.failure_rate:
+        # Without injected failures every error is a bug (or a bench that times the failure path)
+        for r in results:
+            if r.get("errors"):
+                print(f'❌ {r["scenario"]}@{r["size"]}: {r["errors"]} of {r["ops"]} operations failed', file=sys.stderr)
+                status = 1
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ regression {line}", file=sys.stderr)
+        status = status or (1 if regressions else 0)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
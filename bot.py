@@ -4,8 +4,17 @@ from discord.ext import commands
 import json
 import os
 import asyncio
+import hashlib
+import time
 from datetime import datetime, timedelta
 import logging
+from discord import app_commands
+
+from cogs.utils import EmbedCache
+from task_supervisor import TaskSupervisor
+from host_status import HostStatus
+from control_plane import ControlPlane, ControlPlaneError, RemoteService, RemoteVPSManager, DEFAULT_SOCKET, register_gauges, register_task_gauges, socket_in_use, spawn_worker
+import metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,62 +29,229 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-# Bot setup
-bot = commands.Bot(
+# Command tree that stamps every slash command as it arrives (see metrics.py)
+class InstrumentedTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        metrics.mark_received(interaction)
+        return True
+
+# Bot setup (AutoShardedBot runs several gateway shards in this one process)
+sharding_cfg = config.get('sharding', {})
+bot_cls = commands.AutoShardedBot if sharding_cfg.get('enabled', False) else commands.Bot
+shard_kwargs = {'shard_count': sharding_cfg['shard_count']} if sharding_cfg.get('shard_count') else {}
+bot = bot_cls(
     command_prefix="!",
+    tree_cls=InstrumentedTree,
     intents=intents,
     help_command=None,
     activity=discord.Activity(
         type=discord.ActivityType.watching,
         name="🌸 Cute VPS Panels"
-    )
+    ),
+    **shard_kwargs
 )
 
 # Store start time for uptime
 bot.start_time = datetime.utcnow()
 
-# Load cogs
+# Startup / reconnect timings (seconds), logged and kept for monitoring
+bot.startup_metrics = {"cold_start": None, "setup_hook": None, "last_reconnect": None, "reconnects": 0}
+_boot_clock = time.perf_counter()
+_disconnected_at = None
+
+# Shared render cache for static embeds (invalidated by plane edits)
+bot.embed_cache = EmbedCache(config)
+
+# Local /metrics endpoint runner (set in setup_hook)
+bot.metrics_runner = None
+
+# Background jobs (status rotation, metrics, backups, reconciler)
+bot.supervisor = TaskSupervisor()
+
+# VPS registry / Docker orchestration used by the cogs. "local" runs it in
+# this process; "worker" talks to `python control_plane.py` over a unix
+# socket so container work never competes with gateway heartbeats.
+cp_cfg = config.get('control_plane', {})
+bot.control_plane = None
+bot.control_plane_process = None
+if cp_cfg.get('mode', 'local') == 'worker':
+    bot.vps_manager = RemoteVPSManager(cp_cfg.get('socket', DEFAULT_SOCKET))
+    bot.vps_gc = RemoteService(bot.vps_manager, 'gc')
+else:
+    bot.control_plane = ControlPlane(config, bot.supervisor)
+    bot.vps_manager = bot.control_plane.manager
+    bot.vps_gc = bot.control_plane.gc
+
+STATUSES = [
+    (discord.ActivityType.watching, "🌸 Cute VPS Panels"),
+    (discord.ActivityType.playing, "💻 Hosting with Love"),
+    (discord.ActivityType.listening, "🎀 Your VPS requests")
+]
+_status_index = 0
+
+async def rotate_status():
+    global _status_index
+    activity_type, text = STATUSES[_status_index % len(STATUSES)]
+    _status_index += 1
+    await bot.change_presence(activity=discord.Activity(type=activity_type, name=text))
+
+# Cached host load / memory / Docker totals behind /status
+bot.host_status = HostStatus(bot.vps_manager, config.get('host_status', {}))
+
+jobs = config.get('background_jobs', {})
+bot.supervisor.add("status_rotation", rotate_status, interval=jobs.get('status_interval', 30))
+bot.supervisor.add("host_status", bot.host_status.refresh, interval=jobs.get('host_status_interval', 5))
+bot.supervisor.add("loop_lag", metrics.sample_loop_lag, interval=jobs.get('loop_lag_interval', 1))
+
+def task_health():
+    """Bot jobs plus the worker's jobs (reported in its stats pushes) in worker mode"""
+    health = bot.supervisor.health()
+    if bot.control_plane is None:
+        health.update({f"worker:{name}": h for name, h in bot.vps_manager.task_health().items()})
+    return health
+
+bot.task_health = task_health
+
+# Queue depths / task health / gateway latency, evaluated at scrape time
+register_gauges(bot.vps_manager)
+GATEWAY_LATENCY = metrics.REGISTRY.gauge('nxh_gateway_latency_seconds', 'Discord gateway heartbeat latency (mean over shards)')
+GATEWAY_LATENCY.set_function(lambda: bot.latency)
+register_task_gauges(bot.supervisor)
+
+# Helper modules in ./cogs that are not extensions
+NON_EXTENSIONS = {'utils'}
+COMMAND_HASH_FILE = '.command_sync_hash'
+
+# Load cogs (concurrently)
 async def load_cogs():
-    for filename in os.listdir('./cogs'):
-        if filename.endswith('.py') and not filename.startswith('__'):
-            try:
-                await bot.load_extension(f'cogs.{filename[:-3]}')
-                logger.info(f'✅ Loaded cog: {filename}')
-            except Exception as e:
-                logger.error(f'❌ Failed to load cog {filename}: {e}')
+    names = [
+        filename[:-3] for filename in sorted(os.listdir('./cogs'))
+        if filename.endswith('.py') and not filename.startswith('__') and filename[:-3] not in NON_EXTENSIONS
+    ]
+    results = await asyncio.gather(
+        *(bot.load_extension(f'cogs.{name}') for name in names),
+        return_exceptions=True
+    )
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f'❌ Failed to load cog {name}.py: {result}')
+        else:
+            logger.info(f'✅ Loaded cog: {name}.py')
 
-@bot.event
-async def on_ready():
-    logger.info(f'🌸 {bot.user} is online and ready!')
-    logger.info(f'👑 Serving {len(bot.guilds)} server(s)')
+def _command_signature(cmd):
+    sig = {"name": cmd.name, "description": getattr(cmd, 'description', '')}
+    if isinstance(cmd, app_commands.Group):
+        sig["commands"] = [_command_signature(c) for c in cmd.commands]
+    elif isinstance(cmd, app_commands.Command):
+        sig["params"] = [
+            [p.name, p.description, str(p.type), p.required, [str(c.value) for c in p.choices]]
+            for p in cmd.parameters
+        ]
+    else:
+        sig["type"] = str(getattr(cmd, 'type', ''))
+    return sig
+
+def command_tree_hash():
+    """Stable hash of every slash command signature (plus app id)"""
+    sigs = sorted((_command_signature(c) for c in bot.tree.get_commands()), key=lambda s: s['name'])
+    payload = json.dumps({"app": bot.application_id, "commands": sigs}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+async def sync_commands_if_changed():
+    """Only hit the (slow, rate-limited) sync endpoint when signatures changed"""
+    current = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE, 'r', encoding='utf-8') as f:
+            previous = f.read().strip()
+    except FileNotFoundError:
+        previous = None
+    
+    if current == previous:
+        logger.info('🔁 Slash commands unchanged, skipping sync')
+        return
     
-    # Sync slash commands
     try:
         synced = await bot.tree.sync()
         logger.info(f'🔁 Synced {len(synced)} slash commands')
+        with open(COMMAND_HASH_FILE, 'w', encoding='utf-8') as f:
+            f.write(current)
     except Exception as e:
         logger.error(f'❌ Failed to sync commands: {e}')
+
+async def warm_up():
+    """Background warm-up: the in-process control plane, or the worker connection"""
+    if bot.control_plane is not None:
+        try:
+            await bot.control_plane.warm_up()
+        except ControlPlaneError as e:
+            logger.critical(f'❌ {e}; stop it before running this bot in local mode')
+        return
+    if cp_cfg.get('spawn', True):
+        # A worker left running by a killed bot keeps serving; reuse it instead of racing it
+        if await socket_in_use(bot.vps_manager.path):
+            logger.info(f'🛰️ Reusing the control-plane worker already on {bot.vps_manager.path}')
+        else:
+            bot.control_plane_process = await spawn_worker()
+    try:
+        await bot.vps_manager.connect()
+    except Exception as e:
+        logger.error(f'❌ {e}')
+
+@bot.event
+async def setup_hook():
+    # Runs once per process, before the gateway connects
+    t0 = time.perf_counter()
+    await load_cogs()
+    await sync_commands_if_changed()
+    bot.loop.create_task(warm_up())
+    metrics_cfg = config.get('metrics', {})
+    if metrics_cfg.get('enabled', True):
+        try:
+            bot.metrics_runner = await metrics.start_http_server(
+                metrics_cfg.get('host', '127.0.0.1'), metrics_cfg.get('port', 9108)
+            )
+        except OSError as e:
+            logger.error(f'❌ Failed to start metrics endpoint: {e}')
+    bot.startup_metrics['setup_hook'] = time.perf_counter() - t0
+    logger.info(f"⏱️ setup_hook finished in {bot.startup_metrics['setup_hook']:.2f}s")
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    metrics.observe_completion(interaction, command.qualified_name)
+
+@bot.event
+async def on_disconnect():
+    global _disconnected_at
+    if _disconnected_at is None:
+        _disconnected_at = time.perf_counter()
+
+@bot.event
+async def on_resumed():
+    _record_reconnect()
+
+def _record_reconnect():
+    global _disconnected_at
+    if _disconnected_at is None:
+        return
+    elapsed = time.perf_counter() - _disconnected_at
+    _disconnected_at = None
+    bot.startup_metrics['last_reconnect'] = elapsed
+    bot.startup_metrics['reconnects'] += 1
+    logger.info(f'⏱️ Reconnected in {elapsed:.2f}s (reconnect #{bot.startup_metrics["reconnects"]})')
+
+@bot.event
+async def on_ready():
+    logger.info(f'🌸 {bot.user} is online and ready!')
+    logger.info(f'👑 Serving {len(bot.guilds)} server(s) on {bot.shard_count or 1} shard(s)')
     
-    # Set rich presence rotation
-    statuses = [
-        ("watching", "🌸 Cute VPS Panels"),
-        ("playing", "💻 Hosting with Love"),
-        ("listening", "🎀 Your VPS requests")
-    ]
-    
-    async def rotate_status():
-        while True:
-            for activity_type, text in statuses:
-                if activity_type == "watching":
-                    activity = discord.Activity(type=discord.ActivityType.watching, name=text)
-                elif activity_type == "playing":
-                    activity = discord.Activity(type=discord.ActivityType.playing, name=text)
-                else:
-                    activity = discord.Activity(type=discord.ActivityType.listening, name=text)
-                await bot.change_presence(activity=activity)
-                await asyncio.sleep(30)  # Rotate every 30 seconds
+    if bot.startup_metrics['cold_start'] is None:
+        bot.startup_metrics['cold_start'] = time.perf_counter() - _boot_clock
+        logger.info(f"⏱️ Cold start took {bot.startup_metrics['cold_start']:.2f}s")
+    else:
+        _record_reconnect()
     
-    bot.loop.create_task(rotate_status())
+    # on_ready fires on every reconnect; the supervisor only starts jobs once
+    bot.supervisor.start()
 
 @bot.event
 async def on_member_join(member):
@@ -92,6 +268,25 @@ async def on_command_error(ctx, error):
         logger.error(f'⚠️ Command error: {error}')
         await ctx.send("💔 An error occurred. Please try again later!")
 
+async def main():
+    async with bot:
+        try:
+            await bot.start(config['token'])
+        finally:
+            # Clean shutdown of every supervised task before the session closes
+            await bot.supervisor.stop()
+            if bot.metrics_runner:
+                await bot.metrics_runner.cleanup()
+            if bot.control_plane is not None:
+                bot.control_plane.close()
+            else:
+                await bot.vps_manager.close()
+            if bot.control_plane_process and bot.control_plane_process.returncode is None:
+                bot.control_plane_process.terminate()
+                await bot.control_plane_process.wait()
+
 if __name__ == "__main__":
-    asyncio.run(load_cogs())
-    bot.run(config['token'])
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info('👋 Shutting down')
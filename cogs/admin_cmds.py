@@ -5,6 +5,8 @@ from discord.ext import commands
 import json
 import asyncio
 
+import metrics
+
 class AdminCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -20,6 +22,15 @@ class AdminCommands(commands.Cog):
     
     def is_admin(self, user_id):
         return str(user_id) in self.config.get('admins', [])
+
+    async def planes_changed(self) -> str:
+        """Re-render plane embeds and reload the manager's planes (over RPC in worker mode)"""
+        self.bot.embed_cache.update_config(self.config)
+        try:
+            await self.bot.vps_manager.reload_planes()
+            return ""
+        except Exception as e:
+            return f"\n⚠️ VPS manager still uses the old planes until restart: {e}"
     
     # --- Admin Slash Commands ---
     
@@ -137,9 +148,11 @@ class AdminCommands(commands.Cog):
             return
         
         if plane_id in self.config['planes']:
-            self.config['planes'][plane_id] = {"cpu": cpu, "ram": ram, "disk": disk}
+            # Keep I/O / egress limits (see throttle.py) when resizing
+            self.config['planes'][plane_id].update({"cpu": cpu, "ram": ram, "disk": disk})
             self.save_config()
-            await interaction.response.send_message(f"✅ Plane {plane_id} updated!", ephemeral=True)
+            note = await self.planes_changed()
+            await interaction.response.send_message(f"✅ Plane {plane_id} updated!{note}", ephemeral=True)
         else:
             await interaction.response.send_message("⚠️ Plane not found!", ephemeral=True)
     
@@ -152,7 +165,8 @@ class AdminCommands(commands.Cog):
         
         self.config['planes'][plane_id] = {"cpu": cpu, "ram": ram, "disk": disk}
         self.save_config()
-        await interaction.response.send_message(f"✅ New plane {plane_id} added!", ephemeral=True)
+        note = await self.planes_changed()
+        await interaction.response.send_message(f"✅ New plane {plane_id} added!{note}", ephemeral=True)
     
     @app_commands.command(name="delplane", description="➖ Remove a VPS plane")
     @app_commands.describe(plane_id="Plane ID to remove")
@@ -164,7 +178,8 @@ class AdminCommands(commands.Cog):
         if plane_id in self.config['planes']:
             del self.config['planes'][plane_id]
             self.save_config()
-            await interaction.response.send_message(f"✅ Plane {plane_id} removed!", ephemeral=True)
+            note = await self.planes_changed()
+            await interaction.response.send_message(f"✅ Plane {plane_id} removed!{note}", ephemeral=True)
         else:
             await interaction.response.send_message("⚠️ Plane not found!", ephemeral=True)
     
@@ -206,6 +221,128 @@ class AdminCommands(commands.Cog):
         embed.add_field(name="System Load", value="🟢 0.15", inline=False)
         await interaction.response.send_message(embed=embed, ephemeral=True)
     
+    @app_commands.command(name="tasks", description="🧵 Background task health")
+    async def tasks(self, interaction: discord.Interaction):
+        if not self.is_admin(interaction.user.id):
+            await interaction.response.send_message("👑 Only admins can use this command!", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title="🧵 Background Tasks",
+            color=0x3498DB
+        )
+        for name, h in self.bot.task_health().items():
+            icon = "🟢" if h['alive'] and h['state'] != "backoff" else "🔴"
+            last = f"{h['last_run_age']:.0f}s ago" if h['last_run_age'] is not None else "never"
+            value = f"State: `{h['state']}`\nRuns: `{h['runs']}` • Restarts: `{h['restarts']}`\nLast run: `{last}` • Lag: `{h['lag'] * 1000:.0f}ms` (max `{h['max_lag'] * 1000:.0f}ms`)"
+            if h['last_error']:
+                value += f"\nLast error: `{h['last_error'][:200]}`"
+            embed.add_field(name=f"{icon} {name}", value=value, inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="perf", description="⏱️ Compact latency overview (p50 / p99)")
+    async def perf(self, interaction: discord.Interaction):
+        if not self.is_admin(interaction.user.id):
+            await interaction.response.send_message("👑 Only admins can use this command!", ephemeral=True)
+            return
+        
+        def fmt(row):
+            if row is None or row['p50'] is None:
+                return None
+            return f"`{row['p50'] * 1000:.0f}` / `{row['p99'] * 1000:.0f}` ms ({row['count']})"
+        
+        # In worker mode VPS ops, Docker calls and state writes happen in the
+        # worker, which ships their summaries with every stats push
+        if self.bot.control_plane is None:
+            perf = self.bot.vps_manager.stats.get('perf', {})
+            source = "control-plane worker"
+        else:
+            perf = {
+                "vps_ops": metrics.VPS_OP_SECONDS.summary(),
+                "docker": metrics.DOCKER_CALL_SECONDS.summary(),
+                "state_write": metrics.STATE_WRITE_SECONDS.summary(1),
+            }
+            source = "this process"
+        
+        embed = discord.Embed(
+            title="⏱️ Performance (p50 / p99)",
+            color=0x3498DB
+        )
+        embed.set_footer(text=f"VPS ops / Docker / state writes from the {source}")
+        for title, rows in (
+            ("💻 VPS Ops", perf.get('vps_ops', [])),
+            ("🐳 Docker API", perf.get('docker', [])),
+            ("⌨️ Commands", metrics.COMMAND_SECONDS.summary()),
+        ):
+            lines = [f"{row['labels'][0]}: {fmt(row)}" for row in rows if fmt(row)]
+            embed.add_field(name=title, value="\n".join(lines) or "No samples yet", inline=False)
+        
+        loop_lag = fmt(next(iter(metrics.LOOP_LAG_SECONDS.summary(1)), None))
+        state_write = fmt(next(iter(perf.get('state_write', [])), None))
+        embed.add_field(name="🔁 Loop Lag", value=loop_lag or "No samples yet", inline=True)
+        embed.add_field(name="💾 State Write", value=state_write or "No samples yet", inline=True)
+        embed.add_field(
+            name="📥 Queues",
+            value=f"Docker in-flight: `{metrics.QUEUE_DEPTH.get('docker_inflight'):.0f}`\nVPS ops: `{metrics.QUEUE_DEPTH.get('vps_operations'):.0f}`",
+            inline=True
+        )
+        ports = self.bot.vps_manager.ports.usage()
+        embed.add_field(
+            name="🔌 SSH Ports",
+            value=f"`{ports['free']}` free of `{ports['total']}` ({ports['ratio']:.0%} used)",
+            inline=True
+        )
+        # AutoShardedBot reports every shard; a plain Bot has one gateway
+        latencies = getattr(self.bot, 'latencies', None) or [(0, self.bot.latency)]
+        embed.add_field(
+            name="🫀 Gateway",
+            value="\n".join(f"Shard {shard}: `{latency * 1000:.0f}ms`" for shard, latency in latencies[:10]),
+            inline=True
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="gc", description="🧹 Run garbage collection + compaction now")
+    async def gc(self, interaction: discord.Interaction):
+        if not self.is_admin(interaction.user.id):
+            await interaction.response.send_message("👑 Only admins can use this command!", ephemeral=True)
+            return
+        
+        await interaction.response.defer(ephemeral=True)
+        metrics.mark_deferred(interaction)
+        report = await self.bot.vps_gc.run_once()
+        embed = discord.Embed(
+            title="🧹 Garbage Collection",
+            color=0x2ECC71
+        )
+        embed.add_field(name="Records", value=f"`{report['records_before']}` → `{report['records_after']}` ({report['archived']} archived)", inline=False)
+        embed.add_field(name="Backups Trimmed", value=f"`{report['backups_trimmed']}`", inline=True)
+        embed.add_field(name="State File", value=f"`-{report['state_bytes_reclaimed'] // 1024}KB`", inline=True)
+        embed.add_field(name="Orphans", value=f"`{report['containers_removed']}` container(s)", inline=True)
+        embed.add_field(name="Images", value=f"`{report['images_removed']}` removed (`{report['image_bytes'] // (1024 * 1024)}MB`)", inline=True)
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="upgradevps", description="⬆️ Move a VPS to another plane (limits applied live)")
+    @app_commands.describe(hostname="VPS hostname", plane_id="Target plane ID")
+    async def upgradevps(self, interaction: discord.Interaction, hostname: str, plane_id: str):
+        if not self.is_admin(interaction.user.id):
+            await interaction.response.send_message("👑 Only admins can use this command!", ephemeral=True)
+            return
+        
+        manager = self.bot.vps_manager
+        if not manager.get_vps_by_hostname(hostname):
+            await interaction.response.send_message(f"❌ VPS `{hostname}` not found.", ephemeral=True)
+            return
+        if plane_id not in manager.planes:
+            await interaction.response.send_message(f"❌ Plane `{plane_id}` does not exist.", ephemeral=True)
+            return
+        
+        await interaction.response.defer(ephemeral=True)
+        metrics.mark_deferred(interaction)
+        if await manager.upgrade_vps(hostname, plane_id):
+            await interaction.followup.send(f"⬆️ VPS `{hostname}` moved to plane `{plane_id}`.", ephemeral=True)
+        else:
+            await interaction.followup.send(f"❌ Could not move `{hostname}` to plane `{plane_id}`.", ephemeral=True)
+    
     @app_commands.command(name="suspend", description="⏸️ Suspend VPS temporarily")
     @app_commands.describe(hostname="VPS hostname to suspend")
     async def suspend(self, interaction: discord.Interaction, hostname: str):
@@ -231,6 +368,7 @@ class AdminCommands(commands.Cog):
             return
         
         await interaction.response.defer(ephemeral=True)
+        metrics.mark_deferred(interaction)
         await asyncio.sleep(3)  # Simulate backup process
         await interaction.followup.send("✅ Forced backup completed for all VPS instances!", ephemeral=True)
 
@@ -4,15 +4,98 @@ from discord import app_commands
 from discord.ext import commands
 import json
 import os
+import asyncio
 import subprocess
 import random
 import string
 from datetime import datetime
+from typing import Optional
+
+import metrics
+
+# --- Cached embed builders (see utils.EmbedCache) ---
+
+def invites_for_plane(pid):
+    """Invites needed for a numeric plane (Plane 1 = 5, Plane 2 = 10...); None for custom ids"""
+    return int(pid) * 5 if str(pid).isdigit() else None
+
+def build_plane_embed(config):
+    embed = discord.Embed(
+        title="🚀 Available VPS Planes",
+        color=0x3498DB
+    )
+    
+    planes = config.get('planes', {})
+    for pid, specs in planes.items():
+        invite_req = invites_for_plane(pid)
+        embed.add_field(
+            name=f"Plane {pid} 💫",
+            value=f"CPU: {specs['cpu']} cores\nRAM: {specs['ram']}\nDisk: {specs['disk']}\nRequired Invites: {invite_req if invite_req is not None else 'Admin only'}",
+            inline=False
+        )
+    
+    embed.set_footer(text="Use /getvps to start your journey!")
+    return embed
+
+def build_invite_reward_embed(config):
+    embed = discord.Embed(
+        title="🎉 Invite Rewards",
+        description="Invite friends to unlock better VPS planes!",
+        color=0x9B59B6
+    )
+    for pid in config.get('planes', {}):
+        invites_needed = invites_for_plane(pid)
+        if invites_needed is None:
+            continue  # Custom planes are handed out by admins, not earned
+        embed.add_field(
+            name=f"Plane {pid} 🌸",
+            value=f"Requires {invites_needed} invites",
+            inline=False
+        )
+    embed.set_footer(text="Use /myinv to check your current invites")
+    return embed
+
+def build_helpme_embed(config):
+    embed = discord.Embed(
+        title="📖 nxh-i7 Help Menu",
+        description="All available commands for managing your cute VPS!",
+        color=0x3498DB
+    )
+    embed.add_field(
+        name="🌸 User Commands",
+        value="`/myinv` `/getvps` `/plane` `/mange` `/myvps` `/usage` `/backup` `/restore` `/invite_reward` `/status` `/helpme` `/support` `/upgrade` `/stopall` `/botinfo`",
+        inline=False
+    )
+    embed.set_footer(text="Use /support if you need assistance!")
+    return embed
+
+def build_botinfo_embed(config):
+    embed = discord.Embed(
+        title="🌸 nxh-i7 Bot Info",
+        color=0xFF69B4
+    )
+    embed.add_field(name="Version", value="v1.0.0", inline=False)
+    embed.add_field(name="Language", value="Python", inline=False)
+    embed.add_field(name="Features", value="VPS Manager (tmate, Docker, Ubuntu 22.04)", inline=False)
+    embed.set_footer(text="Made by Mustakin 💻✨")
+    return embed
+
+CACHED_EMBEDS = {
+    "plane": build_plane_embed,
+    "invite_reward": build_invite_reward_embed,
+    "helpme": build_helpme_embed,
+    "botinfo": build_botinfo_embed,
+}
 
 class UserCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.load_config()
+        # Static embeds are rendered once and re-rendered only on config changes
+        self.embeds = bot.embed_cache
+        for name, builder in CACHED_EMBEDS.items():
+            self.embeds.register(name, builder)
+        self.embeds.warm()
         
     def load_config(self):
         with open('config.json', 'r', encoding='utf-8') as f:
@@ -57,61 +140,119 @@ class UserCommands(commands.Cog):
     
     @app_commands.command(name="plane", description="🎀 Show 5 starter VPS planes with invite rewards")
     async def plane(self, interaction: discord.Interaction):
-        embed = discord.Embed(
-            title="🚀 Available VPS Planes",
-            color=0x3498DB
-        )
-        
-        planes = self.config.get('planes', {})
-        for pid, specs in planes.items():
-            invite_req = int(pid) * 5  # Example: Plane 1 = 5 invites, Plane 2 = 10, etc.
-            embed.add_field(
-                name=f"Plane {pid} 💫",
-                value=f"CPU: {specs['cpu']} cores\nRAM: {specs['ram']}\nDisk: {specs['disk']}\nRequired Invites: {invite_req}",
-                inline=False
-            )
-        
-        embed.set_footer(text="Use /getvps to start your journey!")
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=self.embeds.get("plane"))
     
     @app_commands.command(name="mange", description="🌸 Manage VPS (start, stop, restart, re-ssh)")
-    async def mange(self, interaction: discord.Interaction):
-        # Placeholder for VPS management UI
-        view = VPSManageView()
-        embed = discord.Embed(
-            title="🌸 VPS Management Panel",
-            description="Select an action below to manage your VPS instance.",
-            color=0xE91E63
-        )
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+    @app_commands.describe(hostname="Hostname of the VPS to manage (optional if you only have one)")
+    async def mange(self, interaction: discord.Interaction, hostname: Optional[str] = None):
+        vps_list = self.bot.vps_manager.get_user_vps(interaction.user.id)
+        if hostname:
+            vps = next((v for v in vps_list if v['hostname'] == hostname), None)
+        else:
+            vps = vps_list[0] if len(vps_list) == 1 else None
+        
+        if not vps:
+            if vps_list and not hostname:
+                names = " ".join(f"`{v['hostname']}`" for v in vps_list[:20])
+                msg = f"💡 You have several VPS, pick one with `/mange hostname:<name>`\n{names}"
+            else:
+                msg = "⚠️ VPS not found! Use `/myvps` to see your instances."
+            await interaction.response.send_message(msg, ephemeral=True)
+            return
+        
+        view = VPSManageView(vps['hostname'])
+        if vps.get('hibernated'):
+            # Idle-hibernated VPS resume on demand; starting can take a few seconds
+            await interaction.response.defer(ephemeral=True)
+            metrics.mark_deferred(interaction)
+            woke = await self.bot.vps_manager.wake_vps(vps['hostname'])
+            note = "☀️ Your VPS was sleeping and has been woken up!" if woke else "💔 Failed to wake your sleeping VPS, try Start."
+            # Re-read: the record may have changed (or gone) while we waited
+            vps = self.bot.vps_manager.get_vps_by_hostname(vps['hostname']) or vps
+            await interaction.followup.send(embed=manage_embed(vps, note), view=view, ephemeral=True)
+            return
+        await interaction.response.send_message(embed=manage_embed(vps), view=view, ephemeral=True)
     
     @app_commands.command(name="myvps", description="🌟 List your VPS instances with details")
     async def myvps(self, interaction: discord.Interaction):
-        # Placeholder - implement user VPS tracking
-        embed = discord.Embed(
-            title="🌟 Your VPS Instances",
-            description="You currently have **0** active VPS instances.",
-            color=0xF1C40F
-        )
-        embed.add_field(name="💡 Tip", value="Use `/getvps` to create your first VPS!", inline=False)
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        # Ack first so heavy users never hit the 3s interaction timeout
+        await interaction.response.defer(ephemeral=True)
+        metrics.mark_deferred(interaction)
+        vps_list = self.bot.vps_manager.get_user_vps(interaction.user.id)
+        
+        if not vps_list:
+            embed = discord.Embed(
+                title="🌟 Your VPS Instances",
+                description="You currently have **0** active VPS instances.",
+                color=0xF1C40F
+            )
+            embed.add_field(name="💡 Tip", value="Use `/getvps` to create your first VPS!", inline=False)
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+        
+        pages = []
+        chunks = [vps_list[i:i + VPS_PER_PAGE] for i in range(0, len(vps_list), VPS_PER_PAGE)]
+        for chunk in chunks:
+            embed = discord.Embed(
+                title="🌟 Your VPS Instances",
+                description=f"You currently have **{len(vps_list)}** active VPS instances.",
+                color=0xF1C40F
+            )
+            for vps in chunk:
+                state = "⏸️ Suspended" if vps.get('suspended') else "💤 Sleeping" if vps.get('hibernated') else ("🟢 Running" if vps.get('status') == 'running' else "🔴 Stopped")
+                embed.add_field(
+                    name=f"💻 {vps['hostname']}",
+                    value=f"Plane: `{vps.get('plane', '?')}`\nStatus: {state}\nSSH Port: `{vps.get('ssh_port', '?')}`\nCreated: `{vps.get('created_at', '?')[:10]}`",
+                    inline=False
+                )
+            pages.append(embed)
+        
+        await send_paginated(interaction, pages)
     
     @app_commands.command(name="usage", description="📊 Show CPU, RAM, Disk usage for your VPS")
     async def usage(self, interaction: discord.Interaction):
-        # Placeholder - implement real usage stats via tmate/Docker
-        embed = discord.Embed(
-            title="📊 Resource Usage",
-            description="📊 Simulated usage for demonstration:",
-            color=0x2ECC71
-        )
-        embed.add_field(name="CPU Usage", value="🟢 12%", inline=True)
-        embed.add_field(name="RAM Usage", value="🟡 45%", inline=True)
-        embed.add_field(name="Disk Usage", value="🔵 30%", inline=True)
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+        metrics.mark_deferred(interaction)
+        vps_list = self.bot.vps_manager.get_user_vps(interaction.user.id)
+        
+        if not vps_list:
+            embed = discord.Embed(
+                title="📊 Resource Usage",
+                description="You don't have any VPS yet. Use `/getvps` to create one!",
+                color=0x2ECC71
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+        
+        # Served from the metrics cache; only stale samples go to Docker
+        usages = await self.bot.vps_manager.get_cached_usage_many([v['hostname'] for v in vps_list])
+        
+        pages = []
+        chunks = [vps_list[i:i + USAGE_PER_PAGE] for i in range(0, len(vps_list), USAGE_PER_PAGE)]
+        for chunk in chunks:
+            embed = discord.Embed(
+                title="📊 Resource Usage",
+                color=0x2ECC71
+            )
+            for vps in chunk:
+                usage = usages.get(vps['hostname'], {})
+                if 'error' in usage:
+                    value = f"⚠️ {usage['error']}"
+                else:
+                    value = f"🟢 CPU: {usage['cpu_percent']}\n🟡 RAM: {usage['memory_percent']} ({usage['memory_used']} / {usage['memory_total']})\n🔵 Disk: {usage['disk_percent']}"
+                    if 'stale' in usage:
+                        value += f"\n⏳ Sampled {usage['stale']} ago"
+                    if 'disk_read_rate' in usage:
+                        value += f"\n💽 I/O: ↓{usage['disk_read_rate']} ↑{usage['disk_write_rate']}\n🌐 Net: ↓{usage['net_rx_rate']} ↑{usage['net_tx_rate']}"
+                embed.add_field(name=f"💻 {vps['hostname']}", value=value, inline=False)
+            pages.append(embed)
+        
+        await send_paginated(interaction, pages)
     
     @app_commands.command(name="backup", description="💾 Generate VPS backup snapshot")
     async def backup(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
+        metrics.mark_deferred(interaction)
         # Placeholder - implement backup system
         await asyncio.sleep(2)
         embed = discord.Embed(
@@ -135,20 +276,7 @@ class UserCommands(commands.Cog):
     
     @app_commands.command(name="invite_reward", description="🎉 Check invite milestones to unlock planes")
     async def invite_reward(self, interaction: discord.Interaction):
-        embed = discord.Embed(
-            title="🎉 Invite Rewards",
-            description="Invite friends to unlock better VPS planes!",
-            color=0x9B59B6
-        )
-        for i in range(1, 6):
-            invites_needed = i * 5
-            embed.add_field(
-                name=f"Plane {i} 🌸",
-                value=f"Requires {invites_needed} invites",
-                inline=False
-            )
-        embed.set_footer(text="Use /myinv to check your current invites")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=self.embeds.get("invite_reward"), ephemeral=True)
     
     @app_commands.command(name="status", description="🕒 Bot uptime + system status")
     async def status(self, interaction: discord.Interaction):
@@ -161,26 +289,31 @@ class UserCommands(commands.Cog):
             title="🕒 System Status",
             color=0x2ECC71
         )
+        # Cached by the host_status job; no filesystem / Docker work per call
+        host = self.bot.host_status.snapshot()
         embed.add_field(name="Bot Uptime", value=uptime_str, inline=False)
-        embed.add_field(name="Active Users", value="0 (placeholder)", inline=True)
-        embed.add_field(name="Active VPS", value="0 (placeholder)", inline=True)
-        embed.add_field(name="System Load", value="🟢 Healthy", inline=False)
+        embed.add_field(name="Active Users", value=str(host['active_users']), inline=True)
+        embed.add_field(name="Active VPS", value=str(host['active_vps']), inline=True)
+        if 'load1' in host:
+            ratio = host['load1'] / host['cpu_count']
+            icon = "🟢" if ratio < 0.7 else "🟡" if ratio < 1.0 else "🔴"
+            load = f"{icon} {host['load1']:.2f} / {host['load5']:.2f} / {host['load15']:.2f} ({host['cpu_count']} CPUs)"
+        else:
+            load = "⏳ Collecting..."
+        embed.add_field(name="System Load", value=load, inline=False)
+        if host.get('mem_total'):
+            used = host['mem_total'] - host['mem_available']
+            embed.add_field(name="Memory", value=f"{used / 1024 ** 3:.1f} / {host['mem_total'] / 1024 ** 3:.1f} GB", inline=True)
+        if 'docker_memory' in host:
+            docker = f"{host['docker_memory'] / 1024 ** 3:.1f} GB RAM"
+            if 'docker_cpu_percent' in host:
+                docker += f" • {host['docker_cpu_percent']:.1f}% CPU"
+            embed.add_field(name="VPS Containers", value=docker, inline=True)
         await interaction.response.send_message(embed=embed, ephemeral=True)
     
     @app_commands.command(name="helpme", description="📖 Show help menu with all commands")
     async def helpme(self, interaction: discord.Interaction):
-        embed = discord.Embed(
-            title="📖 nxh-i7 Help Menu",
-            description="All available commands for managing your cute VPS!",
-            color=0x3498DB
-        )
-        embed.add_field(
-            name="🌸 User Commands",
-            value="`/myinv` `/getvps` `/plane` `/mange` `/myvps` `/usage` `/backup` `/restore` `/invite_reward` `/status` `/helpme` `/support` `/upgrade` `/stopall` `/botinfo`",
-            inline=False
-        )
-        embed.set_footer(text="Use /support if you need assistance!")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=self.embeds.get("helpme"), ephemeral=True)
     
     @app_commands.command(name="support", description="🎧 Send server invite or DM support")
     async def support(self, interaction: discord.Interaction):
@@ -214,36 +347,131 @@ class UserCommands(commands.Cog):
     
     @app_commands.command(name="botinfo", description="✨ Show bot info + credits")
     async def botinfo(self, interaction: discord.Interaction):
-        embed = discord.Embed(
-            title="🌸 nxh-i7 Bot Info",
-            color=0xFF69B4
-        )
-        embed.add_field(name="Version", value="v1.0.0", inline=False)
-        embed.add_field(name="Language", value="Python", inline=False)
-        embed.add_field(name="Features", value="VPS Manager (tmate, Docker, Ubuntu 22.04)", inline=False)
-        embed.set_footer(text="Made by Mustakin 💻✨")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=self.embeds.get("botinfo"), ephemeral=True)
 
-# Simple View for VPS Management (placeholder)
-class VPSManageView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=180)
+# Paginated view for users with many VPS instances
+VPS_PER_PAGE = 5
+USAGE_PER_PAGE = 3
+
+class PaginatorView(discord.ui.View):
+    def __init__(self, pages, owner_id):
+        super().__init__(timeout=120)
+        self.pages = pages
+        self.owner_id = owner_id
+        self.index = 0
+        self._stamp()
+    
+    def _stamp(self):
+        for i, page in enumerate(self.pages):
+            page.set_footer(text=f"Page {i + 1}/{len(self.pages)}")
+        self.prev_button.disabled = self.index == 0
+        self.next_button.disabled = self.index >= len(self.pages) - 1
     
-    @discord.ui.button(label="Start", style=discord.ButtonStyle.green, emoji="▶️")
-    async def start_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_message("✅ Starting your VPS...", ephemeral=True)
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
     
-    @discord.ui.button(label="Stop", style=discord.ButtonStyle.red, emoji="⏹️")
-    async def stop_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_message("🛑 Stopping your VPS...", ephemeral=True)
+    async def _show(self, interaction: discord.Interaction):
+        self._stamp()
+        await interaction.response.edit_message(embed=self.pages[self.index], view=self)
     
-    @discord.ui.button(label="Restart", style=discord.ButtonStyle.blurple, emoji="🔄")
-    async def restart_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_message("🔄 Restarting your VPS...", ephemeral=True)
+    @discord.ui.button(label="Prev", style=discord.ButtonStyle.grey, emoji="◀️")
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index = max(self.index - 1, 0)
+        await self._show(interaction)
     
-    @discord.ui.button(label="Re-SSH", style=discord.ButtonStyle.grey, emoji="🔗")
-    async def ressh_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_message("🔗 Generating new SSH session...", ephemeral=True)
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.grey, emoji="▶️")
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index = min(self.index + 1, len(self.pages) - 1)
+        await self._show(interaction)
+
+async def send_paginated(interaction: discord.Interaction, pages):
+    """Send pages as a followup, attaching a paginator only when needed"""
+    if len(pages) == 1:
+        await interaction.followup.send(embed=pages[0], ephemeral=True)
+        return
+    view = PaginatorView(pages, interaction.user.id)
+    await interaction.followup.send(embed=pages[0], view=view, ephemeral=True)
+
+# --- Persistent VPS management panel ---
+# Buttons carry their hostname in the custom_id (vps:<action>:<hostname>), so
+# no per-message state is kept and panels keep working across restarts.
+
+VPS_ACTIONS = {
+    "start": ("Start", discord.ButtonStyle.green, "▶️", "✅ Starting your VPS..."),
+    "stop": ("Stop", discord.ButtonStyle.red, "⏹️", "🛑 Stopping your VPS..."),
+    "restart": ("Restart", discord.ButtonStyle.blurple, "🔄", "🔄 Restarting your VPS..."),
+    "ressh": ("Re-SSH", discord.ButtonStyle.grey, "🔗", "🔗 Generating new SSH session..."),
+}
+
+def manage_embed(vps, note=None):
+    state = "⏸️ Suspended" if vps.get('suspended') else "💤 Sleeping" if vps.get('hibernated') else ("🟢 Running" if vps.get('status') == 'running' else "🔴 Stopped")
+    embed = discord.Embed(
+        title="🌸 VPS Management Panel",
+        description=note or "Select an action below to manage your VPS instance.",
+        color=0xE91E63
+    )
+    embed.add_field(name="Hostname", value=f"`{vps['hostname']}`", inline=True)
+    embed.add_field(name="Status", value=state, inline=True)
+    if vps.get('tmate_session'):
+        embed.add_field(name="SSH", value=f"`{vps['tmate_session']}`", inline=False)
+    return embed
+
+class VPSActionButton(discord.ui.DynamicItem[discord.ui.Button], template=r'vps:(?P<action>start|stop|restart|ressh):(?P<hostname>[\w-]+)'):
+    def __init__(self, action, hostname):
+        label, style, emoji, _ = VPS_ACTIONS[action]
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=style,
+                emoji=emoji,
+                custom_id=f"vps:{action}:{hostname}"
+            )
+        )
+        self.action = action
+        self.hostname = hostname
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['action'], match['hostname'])
+    
+    async def callback(self, interaction: discord.Interaction):
+        manager = interaction.client.vps_manager
+        vps = manager.get_vps_by_hostname(self.hostname)
+        if not vps or vps.get('deleted', False) or vps['user_id'] != str(interaction.user.id):
+            await interaction.response.send_message("⚠️ This VPS panel is not yours or the VPS no longer exists.", ephemeral=True)
+            return
+        
+        # Ack straight away, then show progress on the panel itself
+        await interaction.response.defer()
+        progress = VPS_ACTIONS[self.action][3]
+        if manager.is_busy(self.hostname):
+            progress += " (waiting for the previous action to finish)"
+        await interaction.edit_original_response(embed=manage_embed(vps, progress))
+        
+        if self.action == "start":
+            ok = await manager.start_vps(self.hostname)
+            note = "✅ VPS started!" if ok else "💔 Failed to start VPS."
+        elif self.action == "stop":
+            ok = await manager.stop_vps(self.hostname)
+            note = "🛑 VPS stopped." if ok else "💔 Failed to stop VPS."
+        elif self.action == "restart":
+            ok = await manager.restart_vps(self.hostname)
+            note = "🔄 VPS restarted!" if ok else "💔 Failed to restart VPS."
+        else:
+            session = await manager.refresh_tmate(self.hostname)
+            note = "🔗 New SSH session ready!" if session else "💔 Failed to generate SSH session."
+        
+        # Re-read: the record may have changed (or gone) while we waited
+        vps = manager.get_vps_by_hostname(self.hostname) or vps
+        await interaction.edit_original_response(embed=manage_embed(vps, note))
+
+class VPSManageView(discord.ui.View):
+    def __init__(self, hostname):
+        super().__init__(timeout=None)
+        for action in VPS_ACTIONS:
+            self.add_item(VPSActionButton(action, hostname))
 
 async def setup(bot):
+    # One registration covers every panel ever sent, including pre-restart ones
+    bot.add_dynamic_items(VPSActionButton)
     await bot.add_cog(UserCommands(bot))
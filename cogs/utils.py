@@ -1,8 +1,11 @@
 # cogs/utils.py → Shared helpers 🛠️
 import discord
 import json
+import logging
 import os
 
+logger = logging.getLogger('nxh-i7.embeds')
+
 def load_config():
     with open('config.json', 'r', encoding='utf-8') as f:
         return json.load(f)
@@ -27,3 +30,44 @@ def error_embed(title, description=""):
 
 def info_embed(title, description=""):
     return discord.Embed(title=title, description=description, color=0x3498DB)
+
+# Render cache for static / semi-static embeds 🎀
+class EmbedCache:
+    """Prebuilt embeds keyed on (name, config version).
+
+    Builders are plain functions taking the config dict. Anything that edits
+    the config (addplane, editplane, delplane) calls update_config() which
+    bumps the version, drops stale renders and pre-warms the new ones.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.version = 0
+        self._builders = {}
+        self._cache = {}
+
+    def register(self, name, builder):
+        self._builders[name] = builder
+        self._cache.pop(name, None)
+
+    def get(self, name):
+        entry = self._cache.get(name)
+        if entry is None or entry[0] != self.version:
+            entry = (self.version, self._builders[name](self.config))
+            self._cache[name] = entry
+        return entry[1]
+
+    def warm(self):
+        # A bad config value must not take the cog (or the command that saved it) down;
+        # the broken embed fails again, visibly, when it is actually requested
+        for name in self._builders:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f'❌ Could not pre-render embed {name}: {e}')
+
+    def update_config(self, config):
+        self.config = config
+        self.version += 1
+        self._cache.clear()
+        self.warm()
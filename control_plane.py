@@ -0,0 +1,593 @@
+# control_plane.py → VPS control plane: in-process or as a separate worker 🛰️
+import asyncio
+import copy
+import fcntl
+import inspect
+import json
+import logging
+import os
+import signal
+import sys
+from typing import Any, Dict, Optional
+
+import metrics
+from idle_reclaim import IdleReclaimer
+from image_manager import ImageManager
+from task_supervisor import TaskSupervisor
+from vps_gc import VPSGarbageCollector
+from vps_manager import VPSManager, count_registry
+
+logger = logging.getLogger('nxh-i7.control')
+
+DEFAULT_SOCKET = "/tmp/nxh-i7-control.sock"
+# A full state snapshot is one line; allow large registries
+LINE_LIMIT = 64 * 1024 * 1024
+
+# VPSManager coroutines callable over the socket
+MANAGER_METHODS = (
+    "create_vps", "start_vps", "stop_vps", "restart_vps", "refresh_tmate",
+    "hibernate_vps", "wake_vps", "upgrade_vps", "delete_vps", "suspend_vps", "resume_vps",
+    "count_active_sessions", "get_resource_usage", "get_cached_usage", "get_cached_usage_many",
+    "sample_metrics", "create_backup", "restore_backup", "reconcile", "reload_planes",
+)
+# Calls whose first argument is a hostname (tracked for is_busy on the bot side)
+HOSTNAME_METHODS = {
+    "start_vps", "stop_vps", "restart_vps", "refresh_tmate", "hibernate_vps", "wake_vps",
+    "upgrade_vps", "delete_vps", "suspend_vps", "resume_vps", "create_backup", "restore_backup",
+}
+
+class ControlPlaneError(Exception):
+    """A remote call failed or the worker is unreachable"""
+
+class ControlPlane:
+    """The VPSManager plus every Docker-facing service and background job.
+
+    bot.py builds one in-process (control_plane.mode = "local", the default);
+    `python control_plane.py` builds one in a worker process and serves it
+    over a unix socket (mode = "worker"). Either way only one process may
+    own the state: lock_state() holds an flock on `<state file>.lock`, which
+    the kernel drops when the owner dies, however it dies.
+    """
+
+    def __init__(self, config: Dict[str, Any], supervisor: Optional[TaskSupervisor] = None):
+        ports_cfg = config.get('ports', {})
+        # Docker connection + state file are loaded lazily / by warm_up()
+        self.manager = VPSManager(
+            port_range=tuple(ports_cfg.get('range', (20000, 29999))),
+            reserved_ports=tuple(tuple(r) for r in ports_cfg.get('reserved', ())),
+            io_device=config.get('throttle', {}).get('io_device')
+        )
+        # Hibernates idle VPS to free host memory (woken again by /mange)
+        self.idle_reclaimer = IdleReclaimer(self.manager, config.get('idle_reclaim', {}))
+        # Plane image digests, pre-pull at startup and snapshot image GC
+        self.image_manager = ImageManager(self.manager, config.get('images', {}))
+        # Archives old soft-deleted records, trims backup history, removes orphans
+        self.gc = VPSGarbageCollector(self.manager, self.image_manager, config.get('gc', {}))
+        # Open + flock'ed by lock_state()
+        self._lock_fh = None
+
+        self.supervisor = supervisor or TaskSupervisor()
+        jobs = config.get('background_jobs', {})
+        metrics_interval = jobs.get('metrics_interval', 30)
+        self.manager.metrics_ttl = max(self.manager.metrics_ttl, metrics_interval * 2.5)
+        self.supervisor.add("metrics_sampler", self.manager.sample_metrics, interval=metrics_interval, initial_delay=5)
+        self.supervisor.add("reconciler", self.reconcile_vps, interval=jobs.get('reconcile_interval', 120), initial_delay=10)
+        self.supervisor.add("idle_reclaim", self.idle_reclaimer.run_once, interval=jobs.get('idle_reclaim_interval', 60), initial_delay=60)
+        self.supervisor.add("gc", self.gc.run_once, interval=jobs.get('gc_interval_hours', 24) * 3600, initial_delay=600)
+
+    async def reconcile_vps(self):
+        result = await self.manager.reconcile()
+        if result['changed']:
+            logger.info(f"🧭 Reconciler updated {result['changed']} VPS record(s), {result['missing']} missing container(s)")
+
+    async def prepare(self):
+        """Crash recovery, then make sure plane images are local"""
+        try:
+            await self.manager.recover_operations()
+        except Exception as e:
+            logger.error(f'❌ Operation recovery failed: {e}')
+        try:
+            results = await self.image_manager.ensure_images()
+            logger.info(f'🧱 Plane images: {results}')
+        except Exception as e:
+            logger.error(f'❌ Image pre-pull failed: {e}')
+
+    def lock_state(self):
+        """Claim the state file; ControlPlaneError if another process owns it"""
+        if self._lock_fh is not None:
+            return
+        path = self.manager.vps_data_file + ".lock"
+        fh = open(path, 'a+')
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            raise ControlPlaneError(f"{path} is held by another bot / control-plane worker")
+        fh.seek(0)
+        fh.truncate()
+        fh.write(f"{os.getpid()}\n")
+        fh.flush()
+        self._lock_fh = fh
+
+    async def warm_up(self):
+        """State lock, Docker + state, then prepare()"""
+        self.lock_state()
+        await self.manager.warm_up()
+        await self.prepare()
+
+    def close(self):
+        self.manager.journal.close()
+        if self._lock_fh is not None:
+            self._lock_fh.close()  # Releases the flock
+            self._lock_fh = None
+
+def register_gauges(manager):
+    """Queue depth / port gauges, evaluated at scrape time (local or remote manager)"""
+    metrics.QUEUE_DEPTH.set_function(lambda: manager.docker_inflight, 'docker_inflight')
+    metrics.QUEUE_DEPTH.set_function(lambda: manager.pending_operations(), 'vps_operations')
+    ports_free = metrics.REGISTRY.gauge('nxh_ports_free', 'Free host SSH ports in the managed range')
+    ports_free.set_function(lambda: manager.ports.free)
+    ports_used = metrics.REGISTRY.gauge('nxh_ports_used_ratio', 'Fraction of the host SSH port range in use')
+    ports_used.set_function(lambda: manager.ports.ratio)
+
+def register_task_gauges(supervisor: TaskSupervisor):
+    task_lag = metrics.REGISTRY.gauge('nxh_task_lag_seconds', 'Background task scheduling lag', ('task',))
+    task_restarts = metrics.REGISTRY.counter('nxh_task_restarts_total', 'Background task restarts', ('task',))
+    for name, job in supervisor.jobs.items():
+        task_lag.set_function(lambda j=job: j.lag, name)
+        task_restarts.set_function(lambda j=job: j.restarts, name)
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode('utf-8')
+
+class ControlPlaneServer:
+    """JSON-lines RPC over a unix socket, run by the worker process.
+
+    Requests:  {"id": n, "method": "start_vps", "args": [...], "kwargs": {...}}
+    Responses: {"id": n, "result": ...} or {"id": n, "error": "...", "type": "ValueError"}
+    Pushes:    {"event": "state", "instances": {...}} once per connection, then
+               {"event": "delta", "changed": {...}, "removed": [...]} after state
+               writes and {"event": "stats", ...} every `stats_interval` seconds.
+
+    Pending deltas are flushed before every response, so a bot that awaits
+    e.g. create_vps() already sees the new record in its replica.
+    """
+
+    def __init__(self, plane: ControlPlane, path: str = DEFAULT_SOCKET, stats_interval: float = 2.0, push_delay: float = 0.05):
+        self.plane = plane
+        self.manager = plane.manager
+        self.path = path
+        self.stats_interval = stats_interval
+        self.push_delay = push_delay
+        self.services = {
+            "gc.run_once": plane.gc.run_once,
+            "idle_reclaim.run_once": plane.idle_reclaimer.run_once,
+            "images.ensure": plane.image_manager.ensure_images,
+        }
+        self._writers: set = set()
+        # Last record versions pushed to clients
+        self._sent: Dict[str, Dict[str, Any]] = {}
+        self._dirty = True
+        self._push_handle = None
+        self._server = None
+        self._stats_task: Optional[asyncio.Task] = None
+        self.manager.save_listeners.append(self._mark_dirty)
+
+    async def start(self):
+        if os.path.exists(self.path):
+            # Only a stale socket (its worker died) may be replaced
+            if await socket_in_use(self.path):
+                raise ControlPlaneError(f"Another control-plane worker is serving {self.path}")
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=LINE_LIMIT)
+        os.chmod(self.path, 0o600)
+        self._stats_task = asyncio.get_running_loop().create_task(self._push_stats())
+        logger.info(f'🛰️ Control plane listening on {self.path}')
+
+    async def close(self):
+        if self._stats_task:
+            self._stats_task.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in list(self._writers):
+            writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._push_handle is not None:
+            return
+        try:
+            self._push_handle = asyncio.get_running_loop().call_later(self.push_delay, self._flush_now)
+        except RuntimeError:
+            pass  # Saved from a worker thread; the next stats tick flushes it
+
+    def _flush_now(self):
+        self._push_handle = None
+        self._flush_state()
+
+    def _flush_state(self):
+        """Push records that changed since the last flush to every client"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        instances = self.manager.vps_instances
+        changed = {h: copy.deepcopy(v) for h, v in instances.items() if self._sent.get(h) != v}
+        removed = [h for h in self._sent if h not in instances]
+        for hostname in removed:
+            del self._sent[hostname]
+        self._sent.update(changed)
+        if changed or removed:
+            self._broadcast({"event": "delta", "changed": changed, "removed": removed})
+
+    def _stats(self) -> Dict[str, Any]:
+        return {
+            "event": "stats",
+            "ports": self.manager.ports.usage(),
+            "docker_inflight": self.manager.docker_inflight,
+            "pending_operations": self.manager.pending_operations(),
+            "busy": [h for h, lock in self.manager._locks.items() if lock.locked()],
+            "tasks": self.plane.supervisor.health(),
+            # These histograms are only observed in this process; /perf on the bot reads them from here
+            "perf": {
+                "vps_ops": metrics.VPS_OP_SECONDS.summary(),
+                "docker": metrics.DOCKER_CALL_SECONDS.summary(),
+                "state_write": metrics.STATE_WRITE_SECONDS.summary(1),
+            },
+        }
+
+    async def _push_stats(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            # Also catches in-memory edits that have not been saved yet
+            self._dirty = True
+            self._flush_state()
+            self._broadcast(self._stats())
+
+    def _broadcast(self, message: Dict[str, Any]):
+        if not self._writers:
+            return
+        data = _encode(message)
+        for writer in list(self._writers):
+            self._write(writer, data)
+
+    def _write(self, writer, data: bytes):
+        try:
+            writer.write(data)
+        except Exception:
+            self._writers.discard(writer)
+
+    async def _handle(self, reader, writer):
+        self._flush_state()
+        self._write(writer, _encode({"event": "state", "instances": self._sent}))
+        self._write(writer, _encode(self._stats()))
+        self._writers.add(writer)
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                # Each call runs concurrently; the manager's per-VPS locks order them
+                task = asyncio.get_running_loop().create_task(self._dispatch(request, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionResetError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Cancelled on shutdown; asyncio's stream callback would log it otherwise
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _resolve(self, method: str):
+        if method in MANAGER_METHODS:
+            return getattr(self.manager, method)
+        if method in self.services:
+            return self.services[method]
+        raise ValueError(f"Unknown control-plane method: {method}")
+
+    async def _dispatch(self, request: Dict[str, Any], writer):
+        try:
+            result = self._resolve(request.get('method'))(*request.get('args', []), **request.get('kwargs', {}))
+            if inspect.isawaitable(result):
+                result = await result
+            response = {"id": request.get('id'), "result": result}
+        except Exception as e:
+            response = {"id": request.get('id'), "error": str(e), "type": type(e).__name__}
+        self._flush_state()
+        self._write(writer, _encode(response))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            self._writers.discard(writer)
+
+class _PortsView:
+    """Read-only PortAllocator stand-in backed by the worker's stats pushes"""
+
+    def __init__(self, client: "RemoteVPSManager"):
+        self._client = client
+
+    def usage(self) -> Dict[str, Any]:
+        return self._client.stats.get('ports') or {"range": "?", "total": 0, "assigned": 0, "blocked": 0, "free": 0, "ratio": 0.0}
+
+    @property
+    def free(self) -> int:
+        return self.usage()['free']
+
+    @property
+    def ratio(self) -> float:
+        return self.usage()['ratio']
+
+class RemoteVPSManager:
+    """Bot-side stand-in for VPSManager when the control plane runs in a worker.
+
+    Coroutines in MANAGER_METHODS are forwarded over the socket; the sync
+    reads the cogs use (get_user_vps, get_vps_by_hostname, ...) are served
+    from a local replica kept current by the worker's pushes, so they never
+    block the gateway loop on Docker or file I/O.
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET, connect_timeout: float = 60.0, call_timeout: float = 600.0):
+        self.path = path
+        self.connect_timeout = connect_timeout
+        self.call_timeout = call_timeout
+        self.planes = self.load_planes()
+        self.ports = _PortsView(self)
+        self.stats: Dict[str, Any] = {}
+        self._instances: Dict[str, Any] = {}
+        self.registry_counts: Dict[str, int] = count_registry({})
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        # hostname -> calls this process has in flight for it
+        self._inflight: Dict[str, int] = {}
+        self._writer = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connected: Optional[asyncio.Event] = None
+        self._closing = False
+
+    # Pure reads shared with VPSManager; they only touch self.vps_instances / planes
+    load_planes = VPSManager.load_planes
+    get_user_vps = VPSManager.get_user_vps
+    get_vps_by_hostname = VPSManager.get_vps_by_hostname
+    get_all_vps_stats = VPSManager.get_all_vps_stats
+    _get_vps_by_plane = VPSManager._get_vps_by_plane
+    image_for_plane = VPSManager.image_for_plane
+
+    @property
+    def vps_instances(self) -> Dict[str, Any]:
+        return self._instances
+
+    @property
+    def creating(self) -> set:
+        return set()
+
+    @property
+    def docker_inflight(self) -> int:
+        return self.stats.get('docker_inflight', 0)
+
+    def pending_operations(self) -> int:
+        return self.stats.get('pending_operations', 0)
+
+    def is_busy(self, hostname: str) -> bool:
+        return self._inflight.get(hostname, 0) > 0 or hostname in self.stats.get('busy', ())
+
+    def task_health(self) -> Dict[str, Dict[str, Any]]:
+        return self.stats.get('tasks', {})
+
+    async def reload_planes(self) -> int:
+        """Reload the bot-side copy (upgrade checks, embeds) and the worker's"""
+        self.planes = self.load_planes()
+        return await self.call('reload_planes')
+
+    async def connect(self):
+        """Connect (retrying until connect_timeout) and start the reader"""
+        if self._connected is None:
+            self._connected = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.connect_timeout
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=LINE_LIMIT)
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if loop.time() >= deadline:
+                    raise ControlPlaneError(f"Control plane at {self.path} unreachable: {e}")
+                await asyncio.sleep(0.5)
+        self._reader_task = loop.create_task(self._read(reader))
+        self._connected.set()
+        logger.info(f'🛰️ Connected to control plane at {self.path}')
+
+    async def _read(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._on_message(json.loads(line))
+        except (ConnectionResetError, ValueError) as e:
+            logger.error(f'❌ Control plane stream error: {e}')
+        finally:
+            self._connected.clear()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ControlPlaneError("Control plane disconnected"))
+            self._pending.clear()
+            if not self._closing:
+                logger.warning('⚠️ Lost control plane connection, reconnecting')
+                asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._closing:
+            try:
+                await self.connect()
+                return
+            except ControlPlaneError as e:
+                logger.error(f'❌ {e}')
+
+    def _on_message(self, message: Dict[str, Any]):
+        event = message.get('event')
+        if event == 'state':
+            for hostname in set(self._instances) - set(message['instances']):
+                del self._instances[hostname]
+            self._merge(message['instances'])
+        elif event == 'delta':
+            self._merge(message['changed'])
+            for hostname in message['removed']:
+                self._instances.pop(hostname, None)
+        if event in ('state', 'delta'):
+            self.registry_counts = count_registry(self._instances)
+        elif event == 'stats':
+            self.stats = message
+        else:
+            future = self._pending.pop(message.get('id'), None)
+            if future is None or future.done():
+                return
+            if 'error' in message:
+                cls = ValueError if message.get('type') == 'ValueError' else ControlPlaneError
+                future.set_exception(cls(message['error']))
+            else:
+                future.set_result(message.get('result'))
+
+    def _merge(self, records: Dict[str, Dict[str, Any]]):
+        """Update records in place, so dicts handed out by get_vps_by_hostname()
+        before an await show the new state like the local VPSManager's do"""
+        for hostname, record in records.items():
+            current = self._instances.get(hostname)
+            if current is None:
+                self._instances[hostname] = record
+            else:
+                current.clear()
+                current.update(record)
+
+    async def call(self, method: str, *args, **kwargs):
+        if self._connected is None or not self._connected.is_set():
+            if self._connected is None:
+                self._connected = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+            except asyncio.TimeoutError:
+                raise ControlPlaneError("Control plane not connected")
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        hostname = args[0] if method in HOSTNAME_METHODS and args else None
+        if hostname:
+            self._inflight[hostname] = self._inflight.get(hostname, 0) + 1
+        try:
+            self._writer.write(_encode({"id": request_id, "method": method, "args": list(args), "kwargs": kwargs}))
+            await self._writer.drain()
+            return await asyncio.wait_for(future, self.call_timeout)
+        finally:
+            self._pending.pop(request_id, None)
+            if hostname:
+                self._inflight[hostname] -= 1
+                if not self._inflight[hostname]:
+                    del self._inflight[hostname]
+
+    async def close(self):
+        self._closing = True
+        if self._writer:
+            self._writer.close()
+        if self._reader_task:
+            self._reader_task.cancel()
+
+def _forward(name: str):
+    async def method(self, *args, **kwargs):
+        return await self.call(name, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(VPSManager, name).__doc__
+    return method
+
+for _name in MANAGER_METHODS:
+    if _name not in RemoteVPSManager.__dict__:  # Explicit overrides also update local state
+        setattr(RemoteVPSManager, _name, _forward(_name))
+
+class RemoteService:
+    """Forwards `<prefix>.run_once` (e.g. /gc) to the worker"""
+
+    def __init__(self, client: RemoteVPSManager, prefix: str):
+        self.client = client
+        self.prefix = prefix
+
+    async def run_once(self):
+        return await self.client.call(f"{self.prefix}.run_once")
+
+async def serve(config: Dict[str, Any]) -> int:
+    """Worker process: own the control plane and serve it until SIGTERM / SIGINT"""
+    cp_cfg = config.get('control_plane', {})
+    plane = ControlPlane(config)
+    jobs = config.get('background_jobs', {})
+    plane.supervisor.add("loop_lag", metrics.sample_loop_lag, interval=jobs.get('loop_lag_interval', 1))
+    register_gauges(plane.manager)
+    register_task_gauges(plane.supervisor)
+
+    # Refuse to run next to a live worker (e.g. one orphaned by a killed bot)
+    try:
+        plane.lock_state()
+    except ControlPlaneError as e:
+        logger.error(f'❌ {e}; not starting a second worker')
+        return 1
+    # State must be loaded before the first client asks for a snapshot
+    await plane.manager.warm_up()
+    server = ControlPlaneServer(plane, cp_cfg.get('socket', DEFAULT_SOCKET))
+    await server.start()
+    loop = asyncio.get_running_loop()
+    prepare_task = loop.create_task(plane.prepare())
+    plane.supervisor.start()
+
+    runner = None
+    metrics_cfg = config.get('metrics', {})
+    if metrics_cfg.get('enabled', True):
+        try:
+            runner = await metrics.start_http_server(
+                metrics_cfg.get('host', '127.0.0.1'), cp_cfg.get('metrics_port', 9109)
+            )
+        except OSError as e:
+            logger.error(f'❌ Failed to start worker metrics endpoint: {e}')
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        prepare_task.cancel()
+        await server.close()
+        await plane.supervisor.stop()
+        if runner:
+            await runner.cleanup()
+        plane.close()
+        logger.info('👋 Control plane stopped')
+    return 0
+
+async def socket_in_use(path: str) -> bool:
+    """True if a worker is accepting connections on `path`"""
+    try:
+        _, writer = await asyncio.open_unix_connection(path)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+async def spawn_worker() -> asyncio.subprocess.Process:
+    """Start `python control_plane.py` next to the bot (control_plane.spawn = true)"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'control_plane.py')
+    process = await asyncio.create_subprocess_exec(sys.executable, script)
+    logger.info(f'🛰️ Spawned control-plane worker (pid {process.pid})')
+    return process
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    sys.exit(asyncio.run(serve(config)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# host_status.py → Cached host load / memory / Docker cgroup totals for /status 🩺
+import asyncio
+import glob
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('nxh-i7.host')
+
+class HostStatus:
+    """Samples host-level status in the background; readers only get the cache.
+
+    refresh() (a supervised job, every few seconds) reads /proc/loadavg,
+    /proc/meminfo and the Docker cgroup totals in a worker thread. snapshot()
+    is a dict lookup plus the registry counts VPSManager keeps up to date on
+    every state write, so /status never touches the filesystem or Docker.
+
+    Config (config.json → "host_status"): cgroup_root, proc_root.
+    """
+
+    def __init__(self, manager, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.manager = manager
+        self.cgroup_root = config.get('cgroup_root', '/sys/fs/cgroup')
+        self.proc_root = config.get('proc_root', '/proc')
+        self.cpu_count = os.cpu_count() or 1
+        self._cache: Dict[str, Any] = {}
+        # (monotonic, docker cpu usage in usec) from the previous sample
+        self._last_cpu: Optional[tuple] = None
+
+    def _read_loadavg(self) -> Dict[str, float]:
+        with open(os.path.join(self.proc_root, 'loadavg'), 'r') as f:
+            load1, load5, load15 = f.read().split()[:3]
+        return {"load1": float(load1), "load5": float(load5), "load15": float(load15)}
+
+    def _read_meminfo(self) -> Dict[str, int]:
+        fields = {}
+        with open(os.path.join(self.proc_root, 'meminfo'), 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('MemTotal', 'MemAvailable'):
+                    fields[key] = int(rest.split()[0]) * 1024
+        return {"mem_total": fields.get('MemTotal', 0), "mem_available": fields.get('MemAvailable', 0)}
+
+    def _docker_cgroups(self) -> list:
+        """Parent cgroup when Docker has one (cgroupfs driver), else each container scope (systemd)"""
+        for parent in ('docker', 'memory/docker'):
+            path = os.path.join(self.cgroup_root, parent)
+            if os.path.isdir(path):
+                return [path]
+        return glob.glob(os.path.join(self.cgroup_root, 'system.slice', 'docker-*.scope'))
+
+    def _read_docker_totals(self) -> Dict[str, int]:
+        paths = self._docker_cgroups()
+        if not paths:
+            return {}  # No Docker cgroup (yet); /status hides the field
+        memory = cpu_usec = 0
+        for path in paths:
+            for name in ('memory.current', 'memory.usage_in_bytes'):
+                value = _read_int(os.path.join(path, name))
+                if value is not None:
+                    memory += value
+                    break
+            usage = _read_cpu_usec(path, self.cgroup_root)
+            if usage is not None:
+                cpu_usec += usage
+        return {"docker_memory": memory, "docker_cpu_usec": cpu_usec}
+
+    def _sample(self) -> Dict[str, Any]:
+        sample: Dict[str, Any] = {}
+        for reader in (self._read_loadavg, self._read_meminfo, self._read_docker_totals):
+            try:
+                sample.update(reader())
+            except (OSError, ValueError) as e:
+                logger.debug(f'Host status reader {reader.__name__} failed: {e}')
+        return sample
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Background job: take a fresh sample and swap it into the cache"""
+        sample = await asyncio.to_thread(self._sample)
+        now = time.monotonic()
+        cpu_usec = sample.pop('docker_cpu_usec', None)
+        if cpu_usec is not None and self._last_cpu and now > self._last_cpu[0]:
+            elapsed_usec = (now - self._last_cpu[0]) * 1_000_000
+            # Percent of the whole host (all CPUs), not of one core
+            sample['docker_cpu_percent'] = max(0.0, cpu_usec - self._last_cpu[1]) / elapsed_usec / self.cpu_count * 100
+        if cpu_usec is not None:
+            self._last_cpu = (now, cpu_usec)
+        sample['cpu_count'] = self.cpu_count
+        sample['sampled_at'] = time.time()
+        self._cache = sample
+        return sample
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cached host sample + O(1) registry counts; never blocks"""
+        status = dict(self._cache)
+        status.update(self.manager.registry_counts)
+        return status
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def _read_cpu_usec(path: str, cgroup_root: str) -> Optional[int]:
+    # cgroup v2: cpu.stat usage_usec; v1: cpuacct.usage (nanoseconds) in the cpuacct hierarchy
+    try:
+        with open(os.path.join(path, 'cpu.stat'), 'r') as f:
+            for line in f:
+                key, _, value = line.partition(' ')
+                if key == 'usage_usec':
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    usage = _read_int(os.path.join(path.replace(os.path.join(cgroup_root, 'memory'), os.path.join(cgroup_root, 'cpuacct')), 'cpuacct.usage'))
+    return usage // 1000 if usage is not None else None
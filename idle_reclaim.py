@@ -0,0 +1,90 @@
+# idle_reclaim.py → Hibernate idle VPS to reclaim host memory 💤
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('nxh-i7.idle')
+
+class IdleReclaimer:
+    """Watches the VPSManager metrics history and hibernates instances that
+    stayed idle (low CPU, low network, nobody connected) for longer than
+    their plane's threshold. Hibernated VPS are woken by /mange or Start.
+
+    Config (config.json → "idle_reclaim"):
+        enabled, default_minutes, cpu_percent, net_bytes_per_sec, max_per_run
+    A plane can override the threshold with "idle_minutes" (0 disables).
+    """
+
+    def __init__(self, manager, config: Dict[str, Any]):
+        self.manager = manager
+        self.enabled = config.get('enabled', True)
+        self.default_minutes = config.get('default_minutes', 60)
+        self.cpu_percent = config.get('cpu_percent', 3.0)
+        self.net_bytes_per_sec = config.get('net_bytes_per_sec', 2048)
+        self.max_per_run = config.get('max_per_run', 10)
+        # hostname -> wall time the current idle streak started
+        self.idle_since: Dict[str, float] = {}
+        # hostname -> (timestamp, net bytes) of the last sample we consumed
+        self._last_sample: Dict[str, tuple] = {}
+        self.hibernated_total = 0
+
+    def threshold_seconds(self, vps: Dict[str, Any]) -> Optional[float]:
+        plane = self.manager.planes.get(vps.get('plane'), {})
+        minutes = plane.get('idle_minutes', self.default_minutes)
+        return minutes * 60 if minutes else None
+
+    def _consume_samples(self, hostname: str):
+        """Fold samples newer than the last one we saw into the idle streak"""
+        history = self.manager.metrics_history.get(hostname)
+        if not history:
+            return
+        last = self._last_sample.get(hostname)
+        for ts, cpu, net_bytes in history:
+            if last and ts <= last[0]:
+                continue
+            net_rate = 0.0
+            if last and ts > last[0] and net_bytes >= last[1]:
+                net_rate = (net_bytes - last[1]) / (ts - last[0])
+            idle = cpu < self.cpu_percent and net_rate < self.net_bytes_per_sec
+            if not idle:
+                self.idle_since.pop(hostname, None)
+            elif hostname not in self.idle_since:
+                self.idle_since[hostname] = ts
+            last = (ts, net_bytes)
+        self._last_sample[hostname] = last
+
+    async def run_once(self) -> Dict[str, int]:
+        """One reclaim pass (supervised background job)"""
+        if not self.enabled:
+            return {"candidates": 0, "hibernated": 0}
+
+        now = time.time()
+        candidates = []
+        for hostname, vps in self.manager.vps_instances.items():
+            if vps.get('deleted', False) or vps.get('status') != 'running' or vps.get('suspended'):
+                self.idle_since.pop(hostname, None)
+                self._last_sample.pop(hostname, None)
+                continue
+            self._consume_samples(hostname)
+            threshold = self.threshold_seconds(vps)
+            since = self.idle_since.get(hostname)
+            if threshold and since is not None and now - since >= threshold and not self.manager.is_busy(hostname):
+                candidates.append(hostname)
+
+        hibernated = 0
+        # Longest-idle first, bounded so one pass never floods Docker
+        for hostname in sorted(candidates, key=lambda h: self.idle_since[h])[:self.max_per_run]:
+            # Only pay for the exec once CPU/network already say idle;
+            # unknown session count means "assume someone is there"
+            sessions = await self.manager.count_active_sessions(hostname)
+            if sessions != 0:
+                self.idle_since.pop(hostname, None)
+                continue
+            if await self.manager.hibernate_vps(hostname):
+                hibernated += 1
+                self.idle_since.pop(hostname, None)
+                self._last_sample.pop(hostname, None)
+                logger.info(f'💤 Hibernated idle VPS {hostname}')
+
+        self.hibernated_total += hibernated
+        return {"candidates": len(candidates), "hibernated": hibernated}
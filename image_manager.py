@@ -0,0 +1,168 @@
+# image_manager.py → VPS image digests, pre-pull + snapshot GC 🧱
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger('nxh-i7.images')
+
+SNAPSHOT_REPOSITORY = "nxh-i7-snapshot"
+SNAPSHOT_LABEL = "nxh-i7.snapshot"
+# Set by ./Dockerfile; marks dangling layers of our own VPS image builds
+IMAGE_LABEL = "org.opencontainers.image.title=nxh-i7-vps"
+
+class ImageManager:
+    """Keeps the Docker host ready to serve /getvps without a cold pull.
+
+    - ensure_images(): make sure every plane's image is present (pulling when
+      needed), verify it against an optional pinned "image_digest" and record
+      the digest per plane in image_state.json. Pinned planes are created
+      from repo@digest (VPSManager.image_for_plane), never from the tag.
+    - collect_garbage(): drop snapshot / committed images that no backup
+      record references any more, superseded plane images and dangling
+      layers of our own images (never other workloads' images on the host).
+
+    Config (config.json → "images"): default_image, snapshot_retention_days,
+    state_file. Planes may set "image" and "image_digest" (a registry digest,
+    "sha256:…" as shown by `docker images --digests`).
+    """
+
+    def __init__(self, manager, config: Dict[str, Any]):
+        self.manager = manager
+        self.snapshot_retention = timedelta(days=config.get('snapshot_retention_days', 14))
+        self.state_file = config.get('state_file', 'image_state.json')
+        if config.get('default_image'):
+            manager.default_image = config['default_image']
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"planes": {}, "superseded": []}
+
+    def _save_state(self):
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+
+    async def _get_or_pull(self, ref: str):
+        client = self.manager.client
+        try:
+            return await self.manager._docker('images.get', client.images.get, ref)
+        except Exception:
+            pass
+        logger.info(f'⬇️ Pulling {ref}')
+        if '@' in ref:
+            # Pull by digest; the SDK splits repo@sha256:… itself
+            return await self.manager._docker('images.pull', client.images.pull, ref)
+        if ':' in ref.rsplit('/', 1)[-1]:
+            repository, tag = ref.rsplit(':', 1)
+        else:
+            repository, tag = ref, 'latest'
+        return await self.manager._docker('images.pull', client.images.pull, repository, tag=tag)
+
+    async def ensure_images(self) -> Dict[str, Any]:
+        """Pre-pull + verify every plane image; returns {plane_id: status}"""
+        results = {}
+        images_by_ref = {}
+        for plane_id in self.manager.planes:
+            ref = self.manager.image_for_plane(plane_id)
+            pinned = self.manager.planes[plane_id].get('image_digest')
+            try:
+                if ref not in images_by_ref:
+                    images_by_ref[ref] = await self._get_or_pull(ref)
+                image = images_by_ref[ref]
+            except Exception as e:
+                logger.error(f'❌ Image {ref} for plane {plane_id} unavailable: {e} (build it with `docker build -t {ref} .`)')
+                results[plane_id] = "missing"
+                continue
+
+            digests = image.attrs.get('RepoDigests') or []
+            verified = pinned is None or any(d.endswith('@' + pinned) for d in digests)
+            if not verified:
+                logger.error(f'❌ Plane {plane_id}: {ref} is {image.id}, expected pinned digest {pinned}')
+
+            previous = self.state["planes"].get(plane_id)
+            if previous and previous.get("id") != image.id:
+                logger.info(f'🔁 Plane {plane_id} image changed {previous["id"][:19]} → {image.id[:19]}')
+                if previous["id"] not in self.state["superseded"]:
+                    self.state["superseded"].append(previous["id"])
+
+            self.state["planes"][plane_id] = {
+                "image": ref,
+                "id": image.id,
+                "digests": digests,
+                "verified": verified,
+                "checked_at": datetime.utcnow().isoformat(),
+            }
+            results[plane_id] = "ok" if verified else "digest-mismatch"
+
+        self._save_state()
+        return results
+
+    def _referenced_images(self) -> set:
+        """Image ids / refs still needed by a plane or a backup record"""
+        refs = {p["id"] for p in self.state["planes"].values()}
+        refs.update(self.manager.image_for_plane(pid) for pid in self.manager.planes)
+        for vps in self.manager.vps_instances.values():
+            for backup in vps.get('backups', []):
+                if backup.get('image'):
+                    refs.add(backup['image'])
+        return refs
+
+    async def collect_garbage(self) -> Dict[str, Any]:
+        """Remove unreferenced snapshot / superseded images; returns what was reclaimed"""
+        client = self.manager.client
+        referenced = self._referenced_images()
+        containers = await self.manager._docker('containers.list', client.containers.list, all=True)
+        # attrs['Image'] is the image id; avoids one images.get per container
+        in_use = {c.attrs.get('Image') for c in containers}
+        cutoff = datetime.utcnow() - self.snapshot_retention
+
+        images = await self.manager._docker('images.list', client.images.list)
+        removed: List[str] = []
+        freed = 0
+        for image in images:
+            tags = image.tags or []
+            is_snapshot = (image.labels or {}).get(SNAPSHOT_LABEL) or any(t.startswith(SNAPSHOT_REPOSITORY + ':') for t in tags)
+            is_superseded = image.id in self.state["superseded"]
+            if not (is_snapshot or is_superseded):
+                continue
+            if image.id in referenced or image.id in in_use or any(t in referenced for t in tags):
+                continue
+            created = _parse_created(image.attrs.get('Created'))
+            if is_snapshot and created and created > cutoff:
+                continue
+            try:
+                await self.manager._docker('images.remove', client.images.remove, image.id, force=False)
+                removed.append(image.id)
+                freed += image.attrs.get('Size', 0)
+                if is_superseded:
+                    self.state["superseded"].remove(image.id)
+            except Exception as e:
+                logger.warning(f'⚠️ Could not remove image {image.id[:19]}: {e}')
+
+        dangling_freed = 0
+        # Only dangling images carrying one of our labels; anything else on the host is not ours to prune
+        for label in (SNAPSHOT_LABEL, IMAGE_LABEL):
+            try:
+                pruned = await self.manager._docker('images.prune', client.images.prune, filters={'dangling': True, 'label': label})
+                dangling_freed += (pruned or {}).get('SpaceReclaimed', 0) or 0
+            except Exception:
+                pass
+
+        self._save_state()
+        result = {"images": len(removed), "bytes": freed + dangling_freed, "removed": removed}
+        if removed or dangling_freed:
+            logger.info(f'🧹 Image GC removed {len(removed)} image(s), freed {(freed + dangling_freed) // (1024 * 1024)}MB')
+        return result
+
+def _parse_created(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        # Docker uses RFC3339 with nanoseconds, e.g. 2024-01-01T00:00:00.123456789Z
+        return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return None
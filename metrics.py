@@ -0,0 +1,216 @@
+# metrics.py → Hot-path instrumentation + Prometheus-style /metrics 📈
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('nxh-i7.metrics')
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RESERVOIR_SIZE = 1024  # recent samples kept per series for /perf percentiles
+
+def _fmt_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts, sum, count, recent samples]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0, deque(maxlen=RESERVOIR_SIZE)]
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.buckets):
+            series[0][idx] += 1
+        series[1] += value
+        series[2] += 1
+        series[3].append(value)
+
+    @contextmanager
+    def time(self, *labels: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def percentile(self, q: float, *labels: str) -> Optional[float]:
+        series = self._series.get(labels)
+        if not series or not series[3]:
+            return None
+        samples = sorted(series[3])
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def label_sets(self) -> List[Tuple[str, ...]]:
+        return list(self._series)
+
+    def summary(self, top: int = 8) -> List[Dict[str, Any]]:
+        """Busiest label sets with p50 / p99 / count; JSON-safe for the worker's stats push"""
+        label_sets = sorted(self._series, key=lambda l: -self.count(*l))[:top]
+        return [
+            {"labels": list(l), "p50": self.percentile(0.5, *l), "p99": self.percentile(0.99, *l), "count": self.count(*l)}
+            for l in label_sets
+        ]
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count, _) in self._series.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = _fmt_labels(self.labelnames, labels, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _fmt_labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {count}"
+            yield f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {count}"
+
+class Gauge:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels: str):
+        self.inc(-amount, *labels)
+
+    def get(self, *labels: str) -> float:
+        fn = self._functions.get(labels)
+        return fn() if fn else self._values.get(labels, 0.0)
+
+    def set_function(self, fn: Callable[[], float], *labels: str):
+        """Evaluate `fn` at scrape time instead of storing a value"""
+        self._functions[labels] = fn
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels in {**self._values, **self._functions}:
+            try:
+                value = self.get(*labels)
+            except Exception:
+                continue
+            yield f"{self.name}{_fmt_labels(self.labelnames, labels)} {value}"
+
+class Counter(Gauge):
+    def render(self) -> Iterable[str]:
+        for line in super().render():
+            yield line.replace(" gauge", " counter", 1) if line.startswith("# TYPE") else line
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _get_or_create(self, cls, name, help, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help, tuple(labelnames), **kwargs)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# --- Hot-path metrics ---
+VPS_OP_SECONDS = REGISTRY.histogram('nxh_vps_operation_seconds', 'VPSManager operation latency', ('op',))
+DOCKER_CALL_SECONDS = REGISTRY.histogram('nxh_docker_call_seconds', 'Docker API call latency', ('call',))
+DOCKER_ERRORS = REGISTRY.counter('nxh_docker_errors_total', 'Docker API calls that raised', ('call',))
+COMMAND_SECONDS = REGISTRY.histogram('nxh_command_seconds', 'Slash-command handler time', ('command',))
+DEFER_TO_REPLY_SECONDS = REGISTRY.histogram('nxh_defer_to_reply_seconds', 'Interaction defer to final reply time', ('command',))
+LOOP_LAG_SECONDS = REGISTRY.histogram('nxh_event_loop_lag_seconds', 'Event loop scheduling lag',
+                                      buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+STATE_WRITE_SECONDS = REGISTRY.histogram('nxh_state_write_seconds', 'State store write time')
+QUEUE_DEPTH = REGISTRY.gauge('nxh_queue_depth', 'Pending work per queue', ('queue',))
+
+def instrumented(op: str):
+    """Time an async VPSManager method into nxh_vps_operation_seconds"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                VPS_OP_SECONDS.observe(time.perf_counter() - t0, op)
+        return wrapper
+    return decorator
+
+# --- Interaction timing (stamped into interaction.extras) ---
+
+def mark_received(interaction):
+    interaction.extras['t_received'] = time.perf_counter()
+
+def mark_deferred(interaction):
+    interaction.extras['t_deferred'] = time.perf_counter()
+
+def observe_completion(interaction, command_name: str):
+    now = time.perf_counter()
+    t_received = interaction.extras.get('t_received')
+    if t_received is not None:
+        COMMAND_SECONDS.observe(now - t_received, command_name)
+    t_deferred = interaction.extras.get('t_deferred')
+    if t_deferred is not None:
+        DEFER_TO_REPLY_SECONDS.observe(now - t_deferred, command_name)
+
+async def sample_loop_lag(probe: float = 0.1):
+    """Sleep for `probe` seconds and record how late the loop woke us up"""
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    await asyncio.sleep(probe)
+    LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - t0 - probe))
+
+# --- Local HTTP endpoint ---
+
+async def start_http_server(host: str = "127.0.0.1", port: int = 9108, registry: Registry = REGISTRY):
+    """Serve GET /metrics on a local port using aiohttp; returns the runner for cleanup"""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f'📈 Metrics endpoint on http://{host}:{port}/metrics')
+    return runner
@@ -0,0 +1,188 @@
+# op_journal.py → Write-ahead journal for multi-step VPS operations 📓
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('nxh-i7.journal')
+
+class OperationJournal:
+    """Append-only JSONL log of operation intent + progress.
+
+    Each multi-step operation writes a "begin" entry before touching Docker,
+    "step" entries as it passes points that change what recovery must do,
+    and an "end" entry with its outcome. Anything without an "end" after a
+    restart was interrupted and is handed to VPSManager.recover_operations().
+
+    Writes are group-committed off the event loop: entries queue up while a
+    worker thread writes + fsyncs the previous batch, so concurrent operations
+    share one fsync. begin() and step() return once their entry is durable,
+    before the step they describe runs; finish() only queues (a lost "end"
+    just makes recovery re-check an operation that already completed). The
+    file is rewritten with only the open operations after recovery and every
+    `compact_every` finished operations, so it stays small.
+    """
+
+    def __init__(self, path: str = "vps_journal.jsonl", fsync: bool = True, compact_every: int = 500):
+        self.path = path
+        self.fsync = fsync
+        self.compact_every = compact_every
+        # op_id -> {"op", "hostname", "data", "steps", "started_at"}
+        self._open: Dict[str, Dict[str, Any]] = {}
+        # Operations begun by this process (never handed to recovery)
+        self._live: set = set()
+        self._loaded = False
+        self._finished_since_compact = 0
+        self._fh = None
+        # (entry, future or None) waiting for the next group commit
+        self._pending: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]] = []
+        self._compact_requested = False
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _file(self):
+        if self._fh is None:
+            self._fh = open(self.path, 'a', encoding='utf-8')
+        return self._fh
+
+    def _write(self, entries: List[Dict[str, Any]]):
+        """Blocking: append a batch with one flush + fsync"""
+        if not entries:
+            return
+        fh = self._file()
+        fh.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        fh.flush()
+        if self.fsync:
+            os.fsync(fh.fileno())
+
+    def _submit(self, entry: Dict[str, Any], wait: bool) -> Optional[asyncio.Future]:
+        self._apply(entry)
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self._pending.append((entry, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        return future
+
+    async def _flush(self):
+        while self._pending or self._compact_requested:
+            batch, self._pending = self._pending, []
+            # Snapshot on the loop thread, where _open is mutated
+            snapshot = self._snapshot() if self._compact_requested else None
+            self._compact_requested = False
+            try:
+                await asyncio.to_thread(self._write_batch, [entry for entry, _ in batch], snapshot)
+            except Exception as e:
+                logger.error(f'❌ Journal write failed: {e}')
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                continue
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_result(None)
+
+    def _write_batch(self, entries: List[Dict[str, Any]], snapshot: Optional[List[str]]):
+        self._write(entries)
+        if snapshot is not None:
+            self._rewrite(snapshot)
+
+    def _apply(self, entry: Dict[str, Any]):
+        op_id = entry.get('id')
+        event = entry.get('event')
+        if event == 'begin':
+            self._open[op_id] = {
+                "op": entry['op'],
+                "hostname": entry['hostname'],
+                "data": dict(entry.get('data') or {}),
+                "steps": [],
+                "started_at": entry.get('ts'),
+            }
+        elif event == 'step' and op_id in self._open:
+            record = self._open[op_id]
+            record['steps'].append(entry['step'])
+            record['data'].update(entry.get('data') or {})
+        elif event == 'end':
+            self._open.pop(op_id, None)
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Replay the journal; returns the interrupted operations from earlier runs"""
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError):
+                        # Torn final write from a crash; nothing after it was acknowledged
+                        continue
+        self._loaded = True
+        return {op_id: rec for op_id, rec in self._open.items() if op_id not in self._live}
+
+    async def begin(self, op: str, hostname: str, **data) -> str:
+        op_id = uuid.uuid4().hex[:12]
+        entry = {"id": op_id, "event": "begin", "op": op, "hostname": hostname,
+                 "data": data, "ts": datetime.utcnow().isoformat()}
+        self._live.add(op_id)
+        await self._submit(entry, wait=True)
+        return op_id
+
+    async def step(self, op_id: str, step: str, **data):
+        entry = {"id": op_id, "event": "step", "step": step, "data": data}
+        await self._submit(entry, wait=True)
+
+    def finish(self, op_id: str, outcome: str = "done"):
+        entry = {"id": op_id, "event": "end", "outcome": outcome, "ts": datetime.utcnow().isoformat()}
+        self._live.discard(op_id)
+        self._finished_since_compact += 1
+        if self._loaded and self._finished_since_compact >= self.compact_every:
+            self._finished_since_compact = 0
+            self._compact_requested = True
+        self._submit(entry, wait=False)
+
+    def open_operations(self) -> int:
+        return len(self._open)
+
+    def hostnames(self) -> set:
+        """Hostnames with an operation still open in the journal"""
+        return {rec['hostname'] for rec in self._open.values()}
+
+    def _snapshot(self) -> List[str]:
+        lines = []
+        for op_id, rec in self._open.items():
+            lines.append(json.dumps({"id": op_id, "event": "begin", "op": rec['op'], "hostname": rec['hostname'],
+                                     "data": rec['data'], "ts": rec['started_at']}, ensure_ascii=False) + "\n")
+            for step in rec['steps']:
+                lines.append(json.dumps({"id": op_id, "event": "step", "step": step, "data": {}}) + "\n")
+        return lines
+
+    def _rewrite(self, lines: List[str]):
+        """Blocking: atomically replace the journal with `lines`"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        os.replace(tmp_path, self.path)
+
+    async def compact(self):
+        """Rewrite the journal with only the still-open operations, after queued writes"""
+        if not self._loaded:
+            self.load()
+        self._finished_since_compact = 0
+        self._compact_requested = True
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        await asyncio.shield(self._flusher)
+
+    def close(self):
+        """Write whatever is still queued (shutdown path) and close the file"""
+        if self._pending:
+            self._write([entry for entry, _ in self._pending])
+            self._pending = []
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
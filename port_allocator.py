@@ -0,0 +1,132 @@
+# port_allocator.py → Host SSH port allocation 🔌
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger('nxh-i7.ports')
+
+class PortExhausted(Exception):
+    """No free host port left in the configured range"""
+
+FREE, ASSIGNED, BLOCKED = 0, 1, 2
+
+class PortAllocator:
+    """Owns a host port range and hands ports out before containers start.
+
+    One byte per port (bytearray bitmap) plus a next-fit cursor keeps
+    allocate() O(1) amortised and release() O(1). Assignments live in the
+    VPS records (ssh_port) and are rebuilt with load() on startup.
+    """
+
+    def __init__(self, start: int = 20000, end: int = 29999, reserved: Iterable[Tuple[int, int]] = (), warn_ratio: float = 0.85):
+        if end < start:
+            raise ValueError("Port range end must be >= start")
+        self.start = start
+        self.end = end
+        self.warn_ratio = warn_ratio
+        self._reserved = [tuple(r) for r in reserved]
+        self._reset()
+
+    def _reset(self):
+        self._bitmap = bytearray(self.end - self.start + 1)
+        self._owner: Dict[str, int] = {}
+        self._cursor = 0
+        self._used = 0
+        for low, high in self._reserved:
+            for port in range(max(low, self.start), min(high, self.end) + 1):
+                self._mark(port, BLOCKED)
+
+    def _mark(self, port: int, state: int):
+        idx = port - self.start
+        was_free = self._bitmap[idx] == FREE
+        self._bitmap[idx] = state
+        if was_free and state != FREE:
+            self._used += 1
+        elif not was_free and state == FREE:
+            self._used -= 1
+
+    def in_range(self, port: int) -> bool:
+        return self.start <= port <= self.end
+
+    def load(self, assignments: Dict[str, object]):
+        """Rebuild from {hostname: port} (ports outside the range are ignored)"""
+        self._reset()
+        for hostname, port in assignments.items():
+            try:
+                port = int(port)
+            except (TypeError, ValueError):
+                continue
+            if self.in_range(port) and self._bitmap[port - self.start] == FREE:
+                self._mark(port, ASSIGNED)
+                self._owner[hostname] = port
+
+    def allocate(self, hostname: str) -> int:
+        """Assign a port to hostname (idempotent)"""
+        if hostname in self._owner:
+            return self._owner[hostname]
+        size = len(self._bitmap)
+        idx = self._bitmap.find(FREE, self._cursor)
+        if idx == -1:
+            idx = self._bitmap.find(FREE, 0, self._cursor)
+        if idx == -1:
+            raise PortExhausted(f"No free ports in {self.start}-{self.end}")
+        port = self.start + idx
+        self._mark(port, ASSIGNED)
+        self._owner[hostname] = port
+        self._cursor = (idx + 1) % size
+        if self.ratio >= self.warn_ratio:
+            logger.warning(f'⚠️ Port range {self.start}-{self.end} is {self.ratio:.0%} used ({self.free} free)')
+        return port
+
+    def claim(self, hostname: str, port) -> bool:
+        """Re-assign a specific port (e.g. a journaled create being rolled forward)"""
+        try:
+            port = int(port)
+        except (TypeError, ValueError):
+            return False
+        if self._owner.get(hostname) == port:
+            return True
+        if not self.in_range(port) or hostname in self._owner or self._bitmap[port - self.start] != FREE:
+            return False
+        self._mark(port, ASSIGNED)
+        self._owner[hostname] = port
+        return True
+
+    def release(self, hostname: str) -> Optional[int]:
+        port = self._owner.pop(hostname, None)
+        if port is not None:
+            self._mark(port, FREE)
+        return port
+
+    def block(self, port: int):
+        """Take a port out of rotation (e.g. something else on the host holds it)"""
+        if not self.in_range(port):
+            return
+        for hostname, owned in list(self._owner.items()):
+            if owned == port:
+                del self._owner[hostname]
+        self._mark(port, BLOCKED)
+
+    def port_of(self, hostname: str) -> Optional[int]:
+        return self._owner.get(hostname)
+
+    @property
+    def total(self) -> int:
+        return len(self._bitmap)
+
+    @property
+    def free(self) -> int:
+        return self.total - self._used
+
+    @property
+    def ratio(self) -> float:
+        return self._used / self.total if self.total else 1.0
+
+    def usage(self) -> Dict[str, object]:
+        return {
+            "range": f"{self.start}-{self.end}",
+            "total": self.total,
+            "assigned": len(self._owner),
+            "blocked": self._used - len(self._owner),
+            "free": self.free,
+            "ratio": round(self.ratio, 4),
+        }
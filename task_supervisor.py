@@ -0,0 +1,133 @@
+# task_supervisor.py → Supervised background tasks 🧵
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+logger = logging.getLogger('nxh-i7.tasks')
+
+class SupervisedJob:
+    """A periodic async job plus its health bookkeeping"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], interval: float, initial_delay: float = 0.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.task: Optional[asyncio.Task] = None
+        self.state = "pending"
+        self.runs = 0
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_run: Optional[float] = None
+        self.last_duration = 0.0
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+class TaskSupervisor:
+    """Starts each background job exactly once, restarts crashed jobs with
+    exponential backoff and reports per-job health / scheduling lag."""
+
+    def __init__(self, base_backoff: float = 1.0, max_backoff: float = 300.0):
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jobs: Dict[str, SupervisedJob] = {}
+        self._started = False
+
+    def add(self, name: str, func: Callable[[], Awaitable[Any]], interval: float, initial_delay: float = 0.0):
+        """Register a job that runs `func()` every `interval` seconds"""
+        if name in self.jobs:
+            raise ValueError(f"Job {name} already registered")
+        job = SupervisedJob(name, func, interval, initial_delay)
+        self.jobs[name] = job
+        if self._started:
+            self._spawn(job)
+        return job
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self):
+        """Start every registered job; safe to call again (e.g. from on_ready)"""
+        if self._started:
+            return
+        self._started = True
+        for job in self.jobs.values():
+            self._spawn(job)
+        logger.info(f'🧵 Supervisor started {len(self.jobs)} background task(s)')
+
+    def _spawn(self, job: SupervisedJob):
+        job.task = asyncio.get_running_loop().create_task(self._supervise(job), name=f"supervised:{job.name}")
+
+    async def _supervise(self, job: SupervisedJob):
+        while True:
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                job.state = "stopped"
+                raise
+            except Exception as e:
+                job.restarts += 1
+                job.consecutive_failures += 1
+                job.last_error = f"{type(e).__name__}: {e}"
+                backoff = min(self.base_backoff * 2 ** (job.consecutive_failures - 1), self.max_backoff)
+                job.state = "backoff"
+                logger.exception(f'💥 Task {job.name} crashed, restarting in {backoff:.0f}s')
+                await asyncio.sleep(backoff)
+
+    async def _run(self, job: SupervisedJob):
+        loop = asyncio.get_running_loop()
+        # The initial delay only applies before the very first run; after a
+        # crash the backoff already spaced things out
+        next_run = loop.time() + (job.initial_delay if job.runs == 0 else 0.0)
+        while True:
+            job.state = "idle"
+            delay = next_run - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            started = loop.time()
+            job.lag = max(0.0, started - next_run)
+            job.max_lag = max(job.max_lag, job.lag)
+            job.state = "running"
+            await job.func()
+            job.last_duration = loop.time() - started
+            job.last_run = time.time()
+            job.runs += 1
+            job.consecutive_failures = 0
+
+            # Fixed-rate schedule; skip ticks we already missed instead of bursting
+            next_run += job.interval
+            if next_run < loop.time():
+                next_run = loop.time()
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        """Per-job health snapshot"""
+        now = time.time()
+        return {
+            name: {
+                "state": job.state,
+                "alive": bool(job.task and not job.task.done()),
+                "runs": job.runs,
+                "restarts": job.restarts,
+                "last_error": job.last_error,
+                "last_run_age": (now - job.last_run) if job.last_run else None,
+                "last_duration": job.last_duration,
+                "lag": job.lag,
+                "max_lag": job.max_lag,
+                "interval": job.interval,
+            }
+            for name, job in self.jobs.items()
+        }
+
+    async def stop(self, timeout: float = 10.0):
+        """Cancel every job and wait for them to finish"""
+        tasks = [job.task for job in self.jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        self._started = False
+        logger.info(f'🧵 Supervisor stopped {len(tasks)} background task(s)')
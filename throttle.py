@@ -0,0 +1,174 @@
+# throttle.py → Per-VPS disk I/O + egress bandwidth limits 🚦
+import asyncio
+import glob
+import logging
+import os
+import re
+import stat
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('nxh-i7.throttle')
+
+# Plane keys (config.json → planes.<id>):
+#   io_read_bps / io_write_bps   e.g. "50MB" (per second) or a byte count
+#   io_read_iops / io_write_iops e.g. 500
+#   net_egress                   tc rate, e.g. "100mbit"
+IO_KEYS = ("io_read_bps", "io_write_bps", "io_read_iops", "io_write_iops")
+
+_UNITS = {"": 1, "B": 1, "KB": 1024, "K": 1024, "MB": 1024 ** 2, "M": 1024 ** 2, "GB": 1024 ** 3, "G": 1024 ** 3}
+
+def parse_rate(value) -> Optional[int]:
+    """"50MB" -> 52428800, 1000 -> 1000, None/0 -> None"""
+    if value in (None, "", 0):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B?)\s*(/s)?\s*", str(value).upper())
+    if not match:
+        raise ValueError(f"Invalid rate: {value}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+def format_rate(bytes_per_sec: float) -> str:
+    for unit, size in (("GB/s", 1024 ** 3), ("MB/s", 1024 ** 2), ("KB/s", 1024)):
+        if bytes_per_sec >= size:
+            return f"{bytes_per_sec / size:.1f}{unit}"
+    return f"{bytes_per_sec:.0f}B/s"
+
+def io_limits(plane: Dict[str, Any]) -> Dict[str, Optional[int]]:
+    return {key: parse_rate(plane.get(key)) for key in IO_KEYS}
+
+def block_device(path: str) -> Optional[str]:
+    """`path` if it is a block device, else None"""
+    try:
+        return path if stat.S_ISBLK(os.stat(path).st_mode) else None
+    except OSError:
+        return None
+
+def detect_io_device(path: str = "/var/lib/docker") -> Optional[str]:
+    """Whole disk backing `path` (Docker's data root), e.g. /dev/nvme0n1 or /dev/vda.
+
+    None when the filesystem has no single block device behind it
+    (overlay, btrfs subvolume, tmpfs...). Blocking; call from a worker thread.
+    """
+    try:
+        dev = os.stat(path).st_dev
+    except OSError:
+        return None
+    if os.major(dev) == 0:
+        return None
+    sys_path = os.path.realpath(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+    if not os.path.isdir(sys_path):
+        return None
+    # Throttles apply to whole disks; nvme0n1p2 -> nvme0n1, vda1 -> vda
+    if os.path.exists(os.path.join(sys_path, "partition")):
+        sys_path = os.path.dirname(sys_path)
+    return block_device(f"/dev/{os.path.basename(sys_path)}")
+
+def resolve_io_device(configured: Optional[str], docker_root: str) -> Optional[str]:
+    """Configured device if it really is one, else the disk behind Docker's data root"""
+    if configured and configured != "auto":
+        device = block_device(configured)
+        if device is None:
+            logger.warning(f'⚠️ throttle.io_device {configured} is not a block device; disk I/O limits disabled')
+        return device
+    device = detect_io_device(docker_root)
+    if device is None:
+        logger.warning(f'⚠️ No block device found behind {docker_root}; disk I/O limits disabled')
+    return device
+
+def blkio_run_kwargs(plane: Dict[str, Any], device: Optional[str]) -> Dict[str, Any]:
+    """containers.run() kwargs for the plane's blkio throttles (none without a device)"""
+    if not device:
+        return {}
+    limits = io_limits(plane)
+    mapping = {
+        "io_read_bps": "device_read_bps",
+        "io_write_bps": "device_write_bps",
+        "io_read_iops": "device_read_iops",
+        "io_write_iops": "device_write_iops",
+    }
+    return {
+        mapping[key]: [{"Path": device, "Rate": value}]
+        for key, value in limits.items() if value
+    }
+
+def _cgroup_dirs(container_id: str):
+    # cgroup v2 (systemd / cgroupfs drivers) first, then v1 blkio
+    yield from glob.glob(f"/sys/fs/cgroup/system.slice/docker-{container_id}.scope")
+    yield from glob.glob(f"/sys/fs/cgroup/docker/{container_id}")
+    yield from glob.glob(f"/sys/fs/cgroup/blkio/docker/{container_id}")
+    yield from glob.glob(f"/sys/fs/cgroup/blkio/system.slice/docker-{container_id}.scope")
+
+def apply_io_limits_live(container_id: str, plane: Dict[str, Any], device: Optional[str]) -> bool:
+    """Rewrite a running container's I/O throttles through its cgroup.
+
+    Docker's update API cannot change device_*_bps, so upgrades write the
+    cgroup files directly. Blocking; call from a worker thread.
+    """
+    if not device:
+        return False
+    limits = io_limits(plane)
+    try:
+        rdev = os.stat(device).st_rdev
+    except OSError as e:
+        logger.warning(f'⚠️ I/O device {device} unavailable, limits not updated: {e}')
+        return False
+    majmin = f"{os.major(rdev)}:{os.minor(rdev)}"
+    try:
+        return _write_cgroup_limits(container_id, limits, majmin)
+    except OSError as e:
+        logger.warning(f'⚠️ Could not write I/O limits for {container_id[:12]}: {e}')
+        return False
+
+def _write_cgroup_limits(container_id: str, limits: Dict[str, Optional[int]], majmin: str) -> bool:
+    for path in _cgroup_dirs(container_id):
+        if os.path.exists(os.path.join(path, "io.max")):
+            fields = {
+                "rbps": limits["io_read_bps"], "wbps": limits["io_write_bps"],
+                "riops": limits["io_read_iops"], "wiops": limits["io_write_iops"],
+            }
+            line = majmin + " " + " ".join(f"{k}={v or 'max'}" for k, v in fields.items())
+            with open(os.path.join(path, "io.max"), "w") as f:
+                f.write(line)
+            return True
+        if os.path.exists(os.path.join(path, "blkio.throttle.read_bps_device")):
+            files = {
+                "blkio.throttle.read_bps_device": limits["io_read_bps"],
+                "blkio.throttle.write_bps_device": limits["io_write_bps"],
+                "blkio.throttle.read_iops_device": limits["io_read_iops"],
+                "blkio.throttle.write_iops_device": limits["io_write_iops"],
+            }
+            for name, value in files.items():
+                # 0 removes the limit in cgroup v1
+                with open(os.path.join(path, name), "w") as f:
+                    f.write(f"{majmin} {value or 0}")
+            return True
+    logger.warning(f'⚠️ No cgroup found for container {container_id[:12]}, I/O limits not updated')
+    return False
+
+async def apply_egress_limit(pid: int, rate: Optional[str]) -> bool:
+    """Shape traffic leaving the container (its eth0 end of the veth pair) with tc tbf.
+
+    Runs `tc` inside the container's network namespace via nsenter, so the
+    image needs nothing extra. The qdisc lives in the netns, which Docker
+    recreates on every start, so callers re-apply after start/restart.
+    """
+    if not pid:
+        return False
+    if rate:
+        cmd = ["nsenter", "-t", str(pid), "-n", "tc", "qdisc", "replace", "dev", "eth0", "root",
+               "tbf", "rate", rate, "burst", "64kb", "latency", "400ms"]
+    else:
+        cmd = ["nsenter", "-t", str(pid), "-n", "tc", "qdisc", "del", "dev", "eth0", "root"]
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await proc.communicate()
+    except FileNotFoundError as e:
+        logger.warning(f'⚠️ Egress shaping unavailable: {e}')
+        return False
+    if proc.returncode != 0 and rate:
+        logger.warning(f'⚠️ tc failed for pid {pid}: {stderr.decode("utf-8", "replace").strip()}')
+        return False
+    return True
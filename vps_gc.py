@@ -0,0 +1,182 @@
+# vps_gc.py → Garbage collection + compaction for the VPS registry 🧹
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('nxh-i7.gc')
+
+class VPSGarbageCollector:
+    """Keeps vps_instances (and therefore every save / stats pass) bounded.
+
+    One pass:
+      1. archives soft-deleted instances older than the retention window to
+         an append-only JSONL cold store and drops them from the registry,
+      2. trims each record's backup history to the newest `keep_backups`,
+      3. removes orphaned vps containers no live record points at, but only
+         for hostnames this bot has a record of (registry, archive or
+         journal), at most `max_orphans_per_run` per pass, and never while
+         the registry is empty (a lost state file must not wipe the host),
+      4. runs image GC (unreferenced snapshots / superseded images),
+    then rewrites the state file once.
+
+    Config (config.json → "gc"): deleted_retention_days, keep_backups,
+    archive_file, orphan_grace_minutes, max_orphans_per_run.
+    """
+
+    def __init__(self, manager, image_manager=None, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.manager = manager
+        self.image_manager = image_manager
+        self.deleted_retention = timedelta(days=config.get('deleted_retention_days', 7))
+        self.keep_backups = config.get('keep_backups', 5)
+        self.archive_file = config.get('archive_file', 'vps_archive.jsonl')
+        self.orphan_grace = timedelta(minutes=config.get('orphan_grace_minutes', 30))
+        self.max_orphans_per_run = config.get('max_orphans_per_run', 10)
+        # Hostnames in the archive, read once then kept current by _archive()
+        self._archived: Optional[set] = None
+        self._foreign_warned: set = set()
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def _archive(self, records: list):
+        with open(self.archive_file, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self._archived is not None:
+            self._archived.update(record['hostname'] for record in records if record.get('hostname'))
+
+    def _load_archived(self) -> set:
+        hostnames = set()
+        if os.path.exists(self.archive_file):
+            with open(self.archive_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        hostnames.add(json.loads(line)['hostname'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        return hostnames
+
+    def compact_registry(self) -> Dict[str, int]:
+        """Steps 1 + 2; pure bookkeeping, runs on the loop thread"""
+        now = datetime.utcnow()
+        instances = self.manager.vps_instances
+        expired = []
+        for hostname, vps in instances.items():
+            if not vps.get('deleted', False) or self.manager.is_busy(hostname):
+                continue
+            deleted_at = _parse_time(vps.get('deleted_at'))
+            if deleted_at is None or now - deleted_at >= self.deleted_retention:
+                expired.append(hostname)
+
+        if expired:
+            self._archive([{**instances[h], "archived_at": now.isoformat()} for h in expired])
+            for hostname in expired:
+                del instances[hostname]
+                self.manager.forget(hostname)
+
+        trimmed = 0
+        for vps in instances.values():
+            backups = vps.get('backups')
+            if backups and len(backups) > self.keep_backups:
+                trimmed += len(backups) - self.keep_backups
+                # Backups are appended in creation order; keep the newest
+                vps['backups'] = backups[-self.keep_backups:] if self.keep_backups else []
+
+        return {"archived": len(expired), "backups_trimmed": trimmed}
+
+    async def remove_orphans(self) -> int:
+        """Step 3: containers labelled as VPS that no live record owns"""
+        client = self.manager.client
+        containers = await self.manager._docker(
+            'containers.list', client.containers.list, all=True, filters={"label": "vps.hostname"}
+        )
+        if containers and not self.manager.vps_instances:
+            logger.warning(f'⚠️ Registry is empty but {len(containers)} VPS container(s) exist; skipping orphan sweep')
+            return 0
+        if self._archived is None:
+            self._archived = await asyncio.to_thread(self._load_archived)
+        # Containers of hostnames we never recorded belong to someone else
+        # (another bot on this host, a restored state file...); leave them alone
+        known = set(self.manager.vps_instances) | self._archived | self.manager.journal.hostnames()
+        live = {
+            vps['container_name'] for vps in self.manager.vps_instances.values()
+            if not vps.get('deleted', False)
+        }
+        cutoff = datetime.utcnow() - self.orphan_grace
+        removed = 0
+        for container in containers:
+            if removed >= self.max_orphans_per_run:
+                logger.info(f'🧹 Orphan sweep stopped at {removed}; the rest wait for the next pass')
+                break
+            hostname = container.labels.get('vps.hostname')
+            if container.name in live or hostname in self.manager.creating or self.manager.is_busy(hostname):
+                continue
+            if hostname not in known:
+                if container.name not in self._foreign_warned:
+                    self._foreign_warned.add(container.name)
+                    logger.warning(f'⚠️ Container {container.name} is not in the registry, archive or journal; not removing it')
+                continue
+            # Never race a create that has not written its record yet
+            created = _parse_time(container.labels.get('vps.created_at'))
+            if created and created > cutoff:
+                continue
+            try:
+                await self.manager._docker('container.remove', container.remove, force=True)
+                removed += 1
+                logger.info(f'🧹 Removed orphaned container {container.name}')
+            except Exception as e:
+                logger.warning(f'⚠️ Could not remove orphan {container.name}: {e}')
+        return removed
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Full GC pass; returns what was reclaimed"""
+        size_before = _file_size(self.manager.vps_data_file)
+        records_before = len(self.manager.vps_instances)
+
+        report: Dict[str, Any] = dict(self.compact_registry())
+        try:
+            report["containers_removed"] = await self.remove_orphans()
+        except Exception as e:
+            logger.error(f'❌ Orphan sweep failed: {e}')
+            report["containers_removed"] = 0
+
+        images = {"images": 0, "bytes": 0}
+        if self.image_manager:
+            try:
+                images = await self.image_manager.collect_garbage()
+            except Exception as e:
+                logger.error(f'❌ Image GC failed: {e}')
+        report["images_removed"] = images["images"]
+        report["image_bytes"] = images["bytes"]
+
+        if report["archived"] or report["backups_trimmed"]:
+            self.manager.save_vps_data()
+        size_after = _file_size(self.manager.vps_data_file)
+
+        report["records_before"] = records_before
+        report["records_after"] = len(self.manager.vps_instances)
+        report["state_bytes_reclaimed"] = max(0, size_before - size_after)
+        report["finished_at"] = datetime.utcnow().isoformat()
+        self.last_report = report
+        logger.info(
+            f"🧹 GC: archived {report['archived']} record(s), trimmed {report['backups_trimmed']} backup(s), "
+            f"removed {report['containers_removed']} container(s) + {report['images_removed']} image(s), "
+            f"state -{report['state_bytes_reclaimed']}B"
+        )
+        return report
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.rstrip('Z'))
+    except ValueError:
+        return None
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -1,20 +1,126 @@
 # vps_manager.py → VPS + tmate manager functions 💻
-import docker
 import subprocess
 import asyncio
+import threading
+import logging
 import random
 import string
 import json
 import os
+import time
+from collections import deque
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+from op_journal import OperationJournal
+from port_allocator import PortAllocator
+from throttle import apply_egress_limit, apply_io_limits_live, blkio_run_kwargs, format_rate, resolve_io_device
+from metrics import (
+    instrumented, DOCKER_CALL_SECONDS, DOCKER_ERRORS, STATE_WRITE_SECONDS
+)
+
+logger = logging.getLogger('nxh-i7.vps')
+
+# tmate server socket inside each VPS (/tmp/tmate is created by the Dockerfile)
+TMATE_SOCKET = "/tmp/tmate/nxh.sock"
+
+def count_registry(instances: Dict[str, Any]) -> Dict[str, int]:
+    """Users owning a live VPS, and running VPS"""
+    live = [v for v in instances.values() if not v.get('deleted', False)]
+    return {
+        "active_users": len({v['user_id'] for v in live}),
+        "active_vps": sum(1 for v in live if v.get('status') == 'running'),
+    }
+
 class VPSManager:
-    def __init__(self):
-        self.client = docker.from_env()
-        self.vps_data_file = "vps_instances.json"
-        self.load_vps_data()
+    def __init__(self, client=None, vps_data_file: str = "vps_instances.json", port_range: tuple = (20000, 29999), reserved_ports: tuple = (), io_device: Optional[str] = None, journal_file: str = "vps_journal.jsonl"):
+        # Docker connection and state file are loaded on first use (or by warm_up)
+        self._client = client
+        # Host SSH ports; rebuilt from the records whenever the registry is loaded
+        self.ports = PortAllocator(port_range[0], port_range[1], reserved_ports)
+        # Hostnames claimed by in-flight create_vps calls
+        self._creating: set = set()
+        # Write-ahead log of multi-step operations, replayed by recover_operations()
+        self.journal = OperationJournal(journal_file)
+        self.recovery_concurrency = 32
+        self.last_recovery: Optional[Dict[str, int]] = None
+        # Called after every state write (the control-plane server pushes replica updates)
+        self.save_listeners: list = []
+        # Recomputed on load / save so /status reads them in O(1)
+        self.registry_counts: Dict[str, int] = {"active_users": 0, "active_vps": 0}
+        self._vps_instances: Optional[Dict[str, Any]] = None
+        self._init_lock = threading.Lock()
+        self.vps_data_file = vps_data_file
         self.planes = self.load_planes()
+        # hostname -> (sampled_at, usage dict); served to /usage and /myvps
+        self.metrics_cache: Dict[str, tuple] = {}
+        # Kept well above the sampler interval (see control_plane.py) so a
+        # sample is normally fresh; older ones are still served, flagged stale
+        self.metrics_ttl = 75.0
+        self.stats_concurrency = 8
+        # hostname -> deque of raw samples, appended by every stats call
+        self.metrics_history: Dict[str, deque] = {}
+        self.history_len = 240
+        # Disk the blkio throttles target: the configured one, or (None / "auto")
+        # the disk behind Docker's data root, resolved by warm_up(). None = no I/O limits
+        self.io_device_setting = io_device
+        self.io_device: Optional[str] = None
+        # hostname -> (monotonic, read bytes, write bytes, rx bytes, tx bytes) for throughput rates
+        self._io_counters: Dict[str, tuple] = {}
+        # hostname -> asyncio.Lock guarding lifecycle operations
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.docker_inflight = 0
+        # Image used by planes without an explicit "image" (see image_manager.py)
+        self.default_image = "nxh-i7-vps"
+        # Fixed waits (seconds); the benchmark harness zeroes these
+        self.boot_wait = 2.0
+        self.tmate_timeout = 30.0
+        self.backup_delay = 1.0
+        self.restore_delay = 2.0
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    import docker
+                    self._client = docker.from_env()
+        return self._client
+
+    @property
+    def vps_instances(self) -> Dict[str, Any]:
+        if self._vps_instances is None:
+            with self._init_lock:
+                if self._vps_instances is None:
+                    self.load_vps_data()
+        return self._vps_instances
+
+    @vps_instances.setter
+    def vps_instances(self, value: Dict[str, Any]):
+        self._vps_instances = value
+        self.ports.load({
+            h: v.get('ssh_port') for h, v in value.items()
+            if not v.get('deleted', False)
+        })
+        self.registry_counts = count_registry(value)
+
+    async def warm_up(self) -> float:
+        """Connect to Docker and load state in a worker thread; returns seconds taken"""
+        t0 = time.perf_counter()
+
+        def _warm():
+            self.vps_instances
+            self.client.ping()
+            docker_root = self.client.info().get('DockerRootDir', '/var/lib/docker')
+            self.io_device = resolve_io_device(self.io_device_setting, docker_root)
+
+        try:
+            await asyncio.to_thread(_warm)
+        except Exception as e:
+            logger.error(f'⚠️ VPSManager warm-up failed: {e}')
+        elapsed = time.perf_counter() - t0
+        logger.info(f'⏱️ VPSManager warm-up took {elapsed:.2f}s ({len(self.vps_instances)} instances)')
+        return elapsed
 
     def load_planes(self) -> Dict[str, Dict[str, str]]:
         """Load VPS plane specs from config.json"""
@@ -25,6 +131,11 @@ class VPSManager:
         except FileNotFoundError:
             return {}
 
+    async def reload_planes(self) -> int:
+        """Pick up plane edits (/addplane, /editplane, /delplane) without a restart"""
+        self.planes = self.load_planes()
+        return len(self.planes)
+
     def load_vps_data(self):
         """Load saved VPS instances from file"""
         if os.path.exists(self.vps_data_file):
@@ -35,8 +146,46 @@ class VPSManager:
 
     def save_vps_data(self):
         """Save VPS instances to file"""
-        with open(self.vps_data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.vps_instances, f, indent=2, ensure_ascii=False)
+        with STATE_WRITE_SECONDS.time():
+            with open(self.vps_data_file, 'w', encoding='utf-8') as f:
+                json.dump(self.vps_instances, f, indent=2, ensure_ascii=False)
+        self.registry_counts = count_registry(self.vps_instances)
+        for listener in self.save_listeners:
+            listener()
+
+    async def _docker(self, call: str, fn, *args, **kwargs):
+        """Run a blocking Docker SDK call in a worker thread, timed per call name"""
+        self.docker_inflight += 1
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        except Exception:
+            DOCKER_ERRORS.inc(1, call)
+            raise
+        finally:
+            self.docker_inflight -= 1
+            DOCKER_CALL_SECONDS.observe(time.perf_counter() - t0, call)
+
+    def pending_operations(self) -> int:
+        """Lifecycle operations currently holding a VPS lock"""
+        return sum(1 for lock in self._locks.values() if lock.locked())
+
+    def image_for_plane(self, plane_id: str) -> str:
+        """Docker image a plane's VPS are created from.
+
+        A pinned "image_digest" turns the ref into repo@digest, so Docker
+        itself resolves (and pulls) exactly that content and a retagged image
+        can never be used for new VPS.
+        """
+        plane = self.planes.get(plane_id, {})
+        image = plane.get('image', self.default_image)
+        digest = plane.get('image_digest')
+        if not digest:
+            return image
+        repository = image.split('@', 1)[0]
+        if ':' in repository.rsplit('/', 1)[-1]:
+            repository = repository.rsplit(':', 1)[0]  # Drop the tag, keep a registry host:port
+        return f"{repository}@{digest}"
 
     def generate_hostname(self, username: str) -> str:
         """Generate clean hostname from username"""
@@ -44,11 +193,12 @@ class VPSManager:
         base = clean if clean else 'user'
         hostname = f"{base}-vps"
         counter = 1
-        while hostname in self.vps_instances:
+        while hostname in self.vps_instances or hostname in self._creating:
             hostname = f"{base}-vps{counter}"
             counter += 1
         return hostname
 
+    @instrumented('create_vps')
     async def create_vps(self, user_id: str, username: str, plane_id: str) -> Dict[str, Any]:
         """Create a new VPS instance in Docker with tmate"""
         if plane_id not in self.planes:
@@ -62,102 +212,119 @@ class VPSManager:
         cpu = plane['cpu']
         ram = plane['ram'].replace('GB', '')  # "2GB" -> "2"
 
+        op_id = None
         try:
-            # Create Docker container with resource limits
-            container = self.client.containers.run(
-                "nxh-i7-vps",  # Your built Docker image
-                name=container_name,
-                detach=True,
-                tty=True,
-                stdin_open=True,
-                ports={'22/tcp': None},  # Auto-assign host port
-                mem_limit=f"{ram}g",
-                cpu_quota=int(cpu * 100000),  # 100000 = 1 full CPU
-                restart_policy={"Name": "unless-stopped"},
-                labels={
-                    "vps.user_id": user_id,
-                    "vps.hostname": hostname,
-                    "vps.plane": plane_id,
-                    "vps.created_at": datetime.utcnow().isoformat()
-                }
+            # Reserved before the first await so a concurrent create cannot pick the same hostname
+            self._creating.add(hostname)
+            op_id = await self.journal.begin(
+                'create_vps', hostname,
+                user_id=user_id, username=username, plane_id=plane_id, container_name=container_name
             )
+            # Host SSH port is picked up-front, so there is no post-start reload
+            for attempt in range(3):
+                ssh_port = self.ports.allocate(hostname)
+                try:
+                    # Create Docker container with resource limits
+                    container = await self._docker(
+                        'containers.run',
+                        self.client.containers.run,
+                        self.image_for_plane(plane_id),  # Built from ./Dockerfile unless the plane overrides it
+                        name=container_name,
+                        detach=True,
+                        tty=True,
+                        stdin_open=True,
+                        ports={'22/tcp': ssh_port},
+                        mem_limit=f"{ram}g",
+                        cpu_quota=int(cpu * 100000),  # 100000 = 1 full CPU
+                        **blkio_run_kwargs(plane, self.io_device),
+                        restart_policy={"Name": "unless-stopped"},
+                        labels={
+                            "vps.user_id": user_id,
+                            "vps.hostname": hostname,
+                            "vps.plane": plane_id,
+                            "vps.created_at": datetime.utcnow().isoformat()
+                        }
+                    )
+                    break
+                except Exception as e:
+                    # Something outside our range bookkeeping holds the port: skip it and retry
+                    if attempt < 2 and ('port is already allocated' in str(e) or 'address already in use' in str(e)):
+                        self.ports.block(ssh_port)
+                        await self._remove_container_quietly(container_name)
+                        continue
+                    raise
+            await self.journal.step(op_id, 'container', container_id=container.id, ssh_port=ssh_port)
 
             # Wait a moment for container to start
-            await asyncio.sleep(2)
-
-            # Get assigned SSH port
-            container.reload()
-            ports = container.attrs['NetworkSettings']['Ports']
-            ssh_port = list(ports['22/tcp'])[0]['HostPort'] if ports.get('22/tcp') else None
-
-            if not ssh_port:
-                raise Exception("Failed to assign SSH port")
+            await asyncio.sleep(self.boot_wait)
+            await self._apply_egress(container, plane)
 
             # Generate tmate session inside container
-            tmate_session = await self._start_tmate_session(container)
+            tmate_session = await self._start_tmate_session(container, ssh_port)
 
             # Store instance data
-            vps_data = {
-                "user_id": user_id,
-                "username": username,
-                "hostname": hostname,
-                "container_id": container.id,
-                "container_name": container_name,
-                "ssh_port": ssh_port,
-                "tmate_session": tmate_session,
-                "plane": plane_id,
-                "status": "running",
-                "created_at": datetime.utcnow().isoformat(),
-                "last_backup": None,
-                "suspended": False
-            }
-
+            vps_data = self._new_record(user_id, username, hostname, container, ssh_port, tmate_session, plane_id)
             self.vps_instances[hostname] = vps_data
             self.save_vps_data()
+            self.journal.finish(op_id)
 
             return vps_data
 
         except Exception as e:
             # Cleanup on failure
-            try:
-                container = self.client.containers.get(container_name)
-                container.remove(force=True)
-            except:
-                pass
+            await self._remove_container_quietly(container_name)
+            self.ports.release(hostname)
+            if op_id is not None:
+                self.journal.finish(op_id, 'rolled_back')
             raise Exception(f"Failed to create VPS: {str(e)}")
+        finally:
+            self._creating.discard(hostname)
+
+    def _new_record(self, user_id, username, hostname, container, ssh_port, tmate_session, plane_id, created_at=None) -> Dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "username": username,
+            "hostname": hostname,
+            "container_id": container.id,
+            "container_name": container.name,
+            "ssh_port": str(ssh_port),
+            "tmate_session": tmate_session,
+            "plane": plane_id,
+            "status": "running",
+            "created_at": created_at or datetime.utcnow().isoformat(),
+            "last_backup": None,
+            "suspended": False
+        }
 
-    async def _start_tmate_session(self, container) -> str:
+    async def _remove_container_quietly(self, container_name: str):
+        try:
+            container = await self._docker('containers.get', self.client.containers.get, container_name)
+            await self._docker('container.remove', container.remove, force=True)
+        except Exception:
+            pass
+
+    async def _start_tmate_session(self, container, ssh_port=None) -> str:
         """Start tmate session inside container and return connection string"""
         try:
-            # Execute tmate in container
-            exec_id = self.client.api.exec_create(
-                container.id,
-                "tmate -F",
-                tty=True
+            # One detached tmate server per VPS on a fixed socket: the previous
+            # one is killed first, and `timeout` bounds the exec inside the
+            # container, so the worker thread running it always comes back
+            sock = TMATE_SOCKET
+            script = (
+                f"tmate -S {sock} kill-server 2>/dev/null; "
+                f"tmate -S {sock} new-session -d && "
+                f"timeout {self.tmate_timeout:.0f} tmate -S {sock} wait tmate-ready && "
+                f"tmate -S {sock} display -p '#{{tmate_ssh}}'"
             )
-
-            # Start async reader for tmate output
-            async def read_tmate_output():
-                exec_stream = self.client.api.exec_start(exec_id, stream=True, tty=True)
-                for line in exec_stream:
-                    line_str = line.decode('utf-8')
-                    if "ssh session:" in line_str:
-                        # Extract tmate SSH URL
-                        parts = line_str.split("ssh session:")
-                        if len(parts) > 1:
-                            return parts[1].strip()
-                return None
-
-            # Timeout after 30 seconds
-            try:
-                tmate_url = await asyncio.wait_for(read_tmate_output(), timeout=30.0)
-                if tmate_url:
-                    return tmate_url
-            except asyncio.TimeoutError:
-                pass
+            exit_code, output = await self._docker('container.exec_run', container.exec_run, ["sh", "-c", script])
+            tmate_url = output.decode('utf-8', 'replace').strip().splitlines()[-1:] if exit_code == 0 else []
+            if tmate_url and tmate_url[0].startswith('ssh '):
+                return tmate_url[0]
 
             # Fallback: return SSH connection info
-            return f"ssh root@localhost -p {container.attrs['NetworkSettings']['Ports']['22/tcp'][0]['HostPort']}"
+            if ssh_port is None:
+                ssh_port = container.attrs['NetworkSettings']['Ports']['22/tcp'][0]['HostPort']
+            return f"ssh root@localhost -p {ssh_port}"
 
         except Exception as e:
             return f"tmate-error: {str(e)}"
@@ -169,107 +336,294 @@ class VPSManager:
             if vps['user_id'] == str(user_id) and not vps.get('deleted', False)
         ]
 
+    @property
+    def creating(self) -> set:
+        """Hostnames whose create_vps is still in flight"""
+        return self._creating
+
+    def forget(self, hostname: str):
+        """Drop per-VPS caches for a record that left the registry"""
+        self.metrics_cache.pop(hostname, None)
+        self.metrics_history.pop(hostname, None)
+        self._io_counters.pop(hostname, None)
+        lock = self._locks.get(hostname)
+        if lock is not None and not lock.locked():
+            del self._locks[hostname]
+
     def get_vps_by_hostname(self, hostname: str) -> Optional[Dict[str, Any]]:
         """Get VPS instance by hostname"""
         return self.vps_instances.get(hostname)
 
-    async def start_vps(self, hostname: str) -> bool:
-        """Start a stopped VPS container"""
-        vps = self.get_vps_by_hostname(hostname)
-        if not vps:
+    def _lock(self, hostname: str) -> asyncio.Lock:
+        """Per-VPS lock so concurrent button presses / commands serialise per hostname"""
+        lock = self._locks.get(hostname)
+        if lock is None:
+            lock = self._locks[hostname] = asyncio.Lock()
+        return lock
+
+    def is_busy(self, hostname: str) -> bool:
+        """True while a lifecycle operation holds the VPS lock"""
+        lock = self._locks.get(hostname)
+        return bool(lock and lock.locked())
+
+    async def _get_container(self, vps: Dict[str, Any]):
+        return await self._docker('containers.get', self.client.containers.get, vps['container_name'])
+
+    async def _apply_egress(self, container, plane: Dict[str, Any]) -> bool:
+        """(Re)apply the plane's net_egress shaping; needed after every start"""
+        if not plane.get('net_egress'):
             return False
+        try:
+            await self._docker('container.reload', container.reload)
+            pid = container.attrs.get('State', {}).get('Pid')
+            return await apply_egress_limit(pid, plane['net_egress'])
+        except Exception as e:
+            logger.warning(f'⚠️ Egress limit not applied to {container.name}: {e}')
+            return False
+
+    # Unlocked lifecycle steps; callers must hold self._lock(hostname)
 
+    async def _start(self, vps: Dict[str, Any]) -> bool:
         try:
-            container = self.client.containers.get(vps['container_name'])
-            container.start()
+            container = await self._get_container(vps)
+            await self._docker('container.start', container.start)
+            await self._apply_egress(container, self.planes.get(vps['plane'], {}))
             vps['status'] = 'running'
             vps['suspended'] = False
+            vps.pop('hibernated', None)
+            # Samples from before the stop say nothing about the new session
+            self.metrics_history.pop(vps['hostname'], None)
             self.save_vps_data()
             return True
         except Exception:
             return False
 
-    async def stop_vps(self, hostname: str) -> bool:
-        """Stop a running VPS container"""
-        vps = self.get_vps_by_hostname(hostname)
-        if not vps:
-            return False
-
+    async def _stop(self, vps: Dict[str, Any]) -> bool:
         try:
-            container = self.client.containers.get(vps['container_name'])
-            container.stop()
+            container = await self._get_container(vps)
+            await self._docker('container.stop', container.stop)
             vps['status'] = 'stopped'
             self.save_vps_data()
             return True
         except Exception:
             return False
 
+    @instrumented('start_vps')
+    async def start_vps(self, hostname: str) -> bool:
+        """Start a stopped VPS container"""
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return False
+
+        async with self._lock(hostname):
+            return await self._start(vps)
+
+    @instrumented('stop_vps')
+    async def stop_vps(self, hostname: str) -> bool:
+        """Stop a running VPS container"""
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return False
+
+        async with self._lock(hostname):
+            return await self._stop(vps)
+
+    @instrumented('restart_vps')
     async def restart_vps(self, hostname: str) -> bool:
         """Restart a VPS container"""
         vps = self.get_vps_by_hostname(hostname)
         if not vps:
             return False
 
-        try:
-            container = self.client.containers.get(vps['container_name'])
-            container.restart()
-            vps['status'] = 'running'
-            # Regenerate tmate session
-            tmate_session = await self._start_tmate_session(container)
-            vps['tmate_session'] = tmate_session
-            self.save_vps_data()
-            return True
-        except Exception:
-            return False
+        async with self._lock(hostname):
+            try:
+                container = await self._get_container(vps)
+                await self._docker('container.restart', container.restart)
+                await self._apply_egress(container, self.planes.get(vps['plane'], {}))
+                vps['status'] = 'running'
+                # Regenerate tmate session
+                tmate_session = await self._start_tmate_session(container, vps.get('ssh_port'))
+                vps['tmate_session'] = tmate_session
+                self.save_vps_data()
+                return True
+            except Exception:
+                return False
 
-    async def delete_vps(self, hostname: str) -> bool:
-        """Delete a VPS instance and its container"""
+    @instrumented('refresh_tmate')
+    async def refresh_tmate(self, hostname: str) -> Optional[str]:
+        """Open a fresh tmate session for a running VPS and return it"""
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return None
+
+        async with self._lock(hostname):
+            try:
+                container = await self._get_container(vps)
+                tmate_session = await self._start_tmate_session(container, vps.get('ssh_port'))
+                vps['tmate_session'] = tmate_session
+                self.save_vps_data()
+                return tmate_session
+            except Exception:
+                return None
+
+    @instrumented('hibernate_vps')
+    async def hibernate_vps(self, hostname: str) -> bool:
+        """Stop an idle VPS to free its memory; it is woken again on demand"""
         vps = self.get_vps_by_hostname(hostname)
         if not vps:
             return False
 
+        async with self._lock(hostname):
+            if vps.get('status') != 'running':
+                return False
+            success = await self._stop(vps)
+            if success:
+                vps['hibernated'] = True
+                vps['hibernated_at'] = datetime.utcnow().isoformat()
+                self.save_vps_data()
+            return success
+
+    @instrumented('wake_vps')
+    async def wake_vps(self, hostname: str) -> bool:
+        """Start a hibernated VPS (no-op for anything else)"""
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps or not vps.get('hibernated'):
+            return False
+
+        async with self._lock(hostname):
+            if not vps.get('hibernated'):
+                return True
+            return await self._start(vps)
+
+    @instrumented('upgrade_vps')
+    async def upgrade_vps(self, hostname: str, plane_id: str) -> bool:
+        """Move a VPS to another plane, applying CPU / RAM / I/O / egress limits live"""
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps or plane_id not in self.planes:
+            return False
+
+        async with self._lock(hostname):
+            op_id = await self.journal.begin('upgrade_vps', hostname, from_plane=vps.get('plane'), to_plane=plane_id)
+            try:
+                await self._upgrade(vps, plane_id)
+                self.journal.finish(op_id)
+                return True
+            except Exception as e:
+                logger.error(f'❌ Upgrade of {hostname} to plane {plane_id} failed: {e}')
+                self.journal.finish(op_id, 'failed')
+                return False
+
+    async def _upgrade(self, vps: Dict[str, Any], plane_id: str):
+        plane = self.planes[plane_id]
+        ram = plane['ram'].replace('GB', '')
+        container = await self._get_container(vps)
+        await self._docker(
+            'container.update',
+            container.update,
+            cpu_quota=int(plane['cpu'] * 100000),
+            mem_limit=f"{ram}g",
+            # Same rule as create: Docker's default memory+swap of twice the memory limit
+            memswap_limit=f"{float(ram) * 2:g}g"
+        )
+        # Docker's update API has no device_*_bps, so go through the cgroup
+        await asyncio.to_thread(apply_io_limits_live, container.id, plane, self.io_device)
+        if vps.get('status') == 'running':
+            if plane.get('net_egress'):
+                await self._apply_egress(container, plane)
+            elif self.planes.get(vps['plane'], {}).get('net_egress'):
+                await self._docker('container.reload', container.reload)
+                await apply_egress_limit(container.attrs.get('State', {}).get('Pid'), None)
+        vps['plane'] = plane_id
+        vps['upgraded_at'] = datetime.utcnow().isoformat()
+        self.save_vps_data()
+
+    async def count_active_sessions(self, hostname: str) -> Optional[int]:
+        """Logged-in ssh sessions + attached tmate clients, or None if unknown"""
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return None
         try:
-            container = self.client.containers.get(vps['container_name'])
-            container.remove(force=True)
-            vps['deleted'] = True
-            vps['deleted_at'] = datetime.utcnow().isoformat()
-            self.save_vps_data()
-            return True
+            container = await self._get_container(vps)
+            # "[s]shd" so pgrep never counts this probe's own `sh -c` command line;
+            # images without procps exit 3 instead of reporting 0 sessions
+            exit_code, output = await self._docker(
+                'container.exec_run',
+                container.exec_run,
+                ["sh", "-c", "command -v pgrep >/dev/null || exit 3; "
+                             f"echo $(pgrep -c -f '[s]shd: .*@' || true) "
+                             f"$(tmate -S {TMATE_SOCKET} display -p '#{{tmate_num_clients}}' 2>/dev/null || echo 0)"]
+            )
         except Exception:
+            return None
+        # Exactly "<ssh sessions> <tmate clients>"; anything else is unknown
+        fields = output.decode('utf-8', 'replace').split()
+        if exit_code != 0 or len(fields) != 2 or not all(f.isdigit() for f in fields):
+            logger.warning(f'⚠️ Session probe on {hostname} failed (exit {exit_code}): {output[:80]!r}')
+            return None
+        return int(fields[0]) + int(fields[1])
+
+    @instrumented('delete_vps')
+    async def delete_vps(self, hostname: str) -> bool:
+        """Delete a VPS instance and its container"""
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
             return False
 
+        async with self._lock(hostname):
+            op_id = await self.journal.begin('delete_vps', hostname)
+            try:
+                container = await self._get_container(vps)
+                await self._docker('container.remove', container.remove, force=True)
+                vps['deleted'] = True
+                vps['deleted_at'] = datetime.utcnow().isoformat()
+                self.ports.release(hostname)
+                self.save_vps_data()
+                self.journal.finish(op_id)
+                return True
+            except Exception:
+                self.journal.finish(op_id, 'failed')
+                return False
+
+    @instrumented('suspend_vps')
     async def suspend_vps(self, hostname: str) -> bool:
         """Suspend a VPS (stop container and mark as suspended)"""
-        success = await self.stop_vps(hostname)
-        if success:
-            vps = self.get_vps_by_hostname(hostname)
-            vps['suspended'] = True
-            self.save_vps_data()
-        return success
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return False
 
+        async with self._lock(hostname):
+            success = await self._stop(vps)
+            if success:
+                vps['suspended'] = True
+                self.save_vps_data()
+            return success
+
+    @instrumented('resume_vps')
     async def resume_vps(self, hostname: str) -> bool:
         """Resume a suspended VPS"""
-        success = await self.start_vps(hostname)
-        if success:
-            vps = self.get_vps_by_hostname(hostname)
-            vps['suspended'] = False
-            self.save_vps_data()
-        return success
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return False
+
+        async with self._lock(hostname):
+            return await self._start(vps)
 
+    @instrumented('get_resource_usage')
     async def get_resource_usage(self, hostname: str) -> Dict[str, str]:
-        """Get CPU, RAM, Disk usage for a VPS"""
+        """Get CPU, RAM, Disk usage for a VPS (always hits Docker, refreshes the cache)"""
         vps = self.get_vps_by_hostname(hostname)
         if not vps:
             return {"error": "VPS not found"}
 
         try:
-            container = self.client.containers.get(vps['container_name'])
-            stats = container.stats(stream=False)
+            container = await self._get_container(vps)
+            stats = await self._docker('container.stats', container.stats, stream=False)
 
             # CPU usage calculation
             cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-            system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats']['system_cpu_usage']
-            cpu_usage = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100 if system_delta > 0 else 0
+            system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats'].get('system_cpu_usage', 0)
+            online_cpus = stats['cpu_stats'].get('online_cpus') or len(stats['cpu_stats']['cpu_usage'].get('percpu_usage') or [1])
+            cpu_usage = (cpu_delta / system_delta) * online_cpus * 100 if system_delta > 0 else 0
 
             # Memory usage
             mem_usage = stats['memory_stats']['usage']
@@ -280,7 +634,7 @@ class VPSManager:
             # In production, you'd exec into container and run `df`
             disk_percent = random.randint(10, 80)  # Simulated
 
-            return {
+            usage = {
                 "cpu_percent": f"{cpu_usage:.1f}%",
                 "memory_percent": f"{mem_percent:.1f}%",
                 "disk_percent": f"{disk_percent}%",
@@ -288,9 +642,82 @@ class VPSManager:
                 "memory_total": f"{mem_limit // (1024*1024)}MB"
             }
 
+            # Measured throughput since the previous sample (blkio + network counters)
+            read_bytes = write_bytes = 0
+            for entry in (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+                op = entry.get('op', '').lower()
+                if op == 'read':
+                    read_bytes += entry.get('value', 0)
+                elif op == 'write':
+                    write_bytes += entry.get('value', 0)
+            networks = (stats.get('networks') or {}).values()
+            rx_bytes = sum(n.get('rx_bytes', 0) for n in networks)
+            tx_bytes = sum(n.get('tx_bytes', 0) for n in networks)
+            now = time.monotonic()
+            previous = self._io_counters.get(hostname)
+            self._io_counters[hostname] = (now, read_bytes, write_bytes, rx_bytes, tx_bytes)
+            if previous and now > previous[0]:
+                elapsed = now - previous[0]
+                # Counters reset when the container restarts; clamp to 0
+                usage["disk_read_rate"] = format_rate(max(0, read_bytes - previous[1]) / elapsed)
+                usage["disk_write_rate"] = format_rate(max(0, write_bytes - previous[2]) / elapsed)
+                usage["net_rx_rate"] = format_rate(max(0, rx_bytes - previous[3]) / elapsed)
+                usage["net_tx_rate"] = format_rate(max(0, tx_bytes - previous[4]) / elapsed)
+            self.metrics_cache[hostname] = (now, usage)
+
+            # Raw history for idle detection: (wall time, cpu %, total net bytes)
+            net_bytes = rx_bytes + tx_bytes
+            history = self.metrics_history.get(hostname)
+            if history is None:
+                history = self.metrics_history[hostname] = deque(maxlen=self.history_len)
+            history.append((time.time(), cpu_usage, net_bytes))
+            return usage
+
         except Exception as e:
             return {"error": f"Failed to get stats: {str(e)}"}
 
+    async def get_cached_usage(self, hostname: str, max_age: Optional[float] = None) -> Dict[str, str]:
+        """Get usage from the metrics cache; only hits Docker when there is no sample at all"""
+        max_age = self.metrics_ttl if max_age is None else max_age
+        cached = self.metrics_cache.get(hostname)
+        if cached:
+            age = time.monotonic() - cached[0]
+            if age <= max_age:
+                return cached[1]
+            # The sampler is behind; a late sample beats a stats call per VPS in the handler
+            return {**cached[1], "stale": f"{age:.0f}s"}
+        vps = self.get_vps_by_hostname(hostname)
+        if vps and vps.get('status') != 'running':
+            return {"error": "VPS is not running"}
+        return await self.get_resource_usage(hostname)
+
+    async def get_cached_usage_many(self, hostnames: list) -> Dict[str, Dict[str, str]]:
+        """Cached usage for several VPS at once, refreshing stale ones concurrently"""
+        sem = asyncio.Semaphore(self.stats_concurrency)
+
+        async def one(hostname):
+            async with sem:
+                return hostname, await self.get_cached_usage(hostname)
+
+        return dict(await asyncio.gather(*(one(h) for h in hostnames)))
+
+    @instrumented('sample_metrics')
+    async def sample_metrics(self) -> int:
+        """Refresh the metrics cache for every running VPS (background sampler)"""
+        hostnames = [
+            h for h, v in self.vps_instances.items()
+            if v.get('status') == 'running' and not v.get('deleted', False)
+        ]
+        sem = asyncio.Semaphore(self.stats_concurrency)
+
+        async def one(hostname):
+            async with sem:
+                await self.get_resource_usage(hostname)
+
+        await asyncio.gather(*(one(h) for h in hostnames))
+        return len(hostnames)
+
+    @instrumented('create_backup')
     async def create_backup(self, hostname: str) -> str:
         """Create a backup snapshot of the VPS"""
         vps = self.get_vps_by_hostname(hostname)
@@ -306,27 +733,35 @@ class VPSManager:
         # 3. Restart container
         # For now, simulate
 
-        await self.stop_vps(hostname)
-        await asyncio.sleep(1)  # Simulate backup process
-        await self.start_vps(hostname)
+        async with self._lock(hostname):
+            # An interruption leaves the VPS stopped; recovery restarts it
+            op_id = await self.journal.begin(
+                'create_backup', hostname,
+                snapshot_id=snapshot_id, was_running=vps.get('status') == 'running'
+            )
+            await self._stop(vps)
+            await asyncio.sleep(self.backup_delay)  # Simulate backup process
+            await self._start(vps)
+
+            # Store backup info
+            if 'backups' not in vps:
+                vps['backups'] = []
+
+            backup_info = {
+                "snapshot_id": snapshot_id,
+                "created_at": snapshot_time,
+                "size": "1.2GB",  # Simulated
+                "status": "completed"
+            }
 
-        # Store backup info
-        if 'backups' not in vps:
-            vps['backups'] = []
-        
-        backup_info = {
-            "snapshot_id": snapshot_id,
-            "created_at": snapshot_time,
-            "size": "1.2GB",  # Simulated
-            "status": "completed"
-        }
-        
-        vps['backups'].append(backup_info)
-        vps['last_backup'] = snapshot_time
-        self.save_vps_data()
+            vps['backups'].append(backup_info)
+            vps['last_backup'] = snapshot_time
+            self.save_vps_data()
+            self.journal.finish(op_id)
 
         return snapshot_id
 
+    @instrumented('restore_backup')
     async def restore_backup(self, hostname: str, snapshot_id: str) -> bool:
         """Restore VPS from backup snapshot"""
         vps = self.get_vps_by_hostname(hostname)
@@ -339,15 +774,152 @@ class VPSManager:
             return False
 
         # Simulate restore process
-        await self.stop_vps(hostname)
-        await asyncio.sleep(2)
-        await self.start_vps(hostname)
+        async with self._lock(hostname):
+            op_id = await self.journal.begin('restore_backup', hostname, snapshot_id=snapshot_id)
+            await self._stop(vps)
+            await asyncio.sleep(self.restore_delay)
+            await self._start(vps)
+
+            vps['last_restore'] = datetime.utcnow().isoformat()
+            vps['restored_from'] = snapshot_id
+            self.save_vps_data()
+            self.journal.finish(op_id)
+
+        return True
 
+    # Crash recovery: one handler per journaled operation, called with the
+    # hostname lock held; each returns the outcome recorded in the journal
+
+    @instrumented('recover_operations')
+    async def recover_operations(self) -> Dict[str, int]:
+        """Roll operations interrupted by a crash forward or back (run once at startup)"""
+        pending = self.journal.load()
+        summary: Dict[str, int] = {}
+        if pending:
+            logger.info(f'📓 Recovering {len(pending)} interrupted operation(s)')
+            semaphore = asyncio.Semaphore(self.recovery_concurrency)
+
+            async def one(op_id: str, record: Dict[str, Any]) -> str:
+                handler = getattr(self, f"_recover_{record['op']}", None)
+                async with semaphore:
+                    async with self._lock(record['hostname']):
+                        try:
+                            outcome = await handler(record['hostname'], record) if handler else 'abandoned'
+                        except Exception as e:
+                            logger.error(f"❌ Recovery of {record['op']} on {record['hostname']} failed: {e}")
+                            outcome = 'failed'
+                self.journal.finish(op_id, outcome)
+                return outcome
+
+            # Different hostnames recover in parallel; the per-VPS lock orders the rest
+            for outcome in await asyncio.gather(*(one(op_id, rec) for op_id, rec in pending.items())):
+                summary[outcome] = summary.get(outcome, 0) + 1
+            logger.info(f'📓 Recovery finished: {summary}')
+        await self.journal.compact()
+        self.last_recovery = summary
+        return summary
+
+    async def _recover_create_vps(self, hostname: str, record: Dict[str, Any]) -> str:
+        data = record['data']
+        existing = self.vps_instances.get(hostname)
+        if existing and not existing.get('deleted', False):
+            return 'done'  # Record was written; only the "end" entry was lost
+
+        self._creating.add(hostname)
+        try:
+            # Container was created: finish the job if its port is still ours
+            if 'container' in record['steps'] and self.ports.claim(hostname, data.get('ssh_port')):
+                try:
+                    container = await self._docker('containers.get', self.client.containers.get, data['container_name'])
+                    if container.status != 'running':
+                        await self._docker('container.start', container.start)
+                        await asyncio.sleep(self.boot_wait)
+                    await self._apply_egress(container, self.planes.get(data['plane_id'], {}))
+                    tmate_session = await self._start_tmate_session(container, data['ssh_port'])
+                    self.vps_instances[hostname] = self._new_record(
+                        data['user_id'], data['username'], hostname, container,
+                        data['ssh_port'], tmate_session, data['plane_id'], record.get('started_at')
+                    )
+                    self.save_vps_data()
+                    return 'rolled_forward'
+                except Exception as e:
+                    logger.warning(f'⚠️ Could not finish create of {hostname}, rolling back: {e}')
+            await self._remove_container_quietly(data['container_name'])
+            self.ports.release(hostname)
+            return 'rolled_back'
+        finally:
+            self._creating.discard(hostname)
+
+    async def _recover_create_backup(self, hostname: str, record: Dict[str, Any]) -> str:
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return 'abandoned'
+        snapshot_id = record['data'].get('snapshot_id')
+        if any(b.get('snapshot_id') == snapshot_id for b in vps.get('backups', [])):
+            return 'done'
+        # The snapshot never completed: drop it and bring the VPS back up
+        if record['data'].get('was_running') and not vps.get('deleted', False):
+            await self._start(vps)
+        return 'rolled_back'
+
+    async def _recover_restore_backup(self, hostname: str, record: Dict[str, Any]) -> str:
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps or vps.get('deleted', False):
+            return 'abandoned'
+        await self._start(vps)
         vps['last_restore'] = datetime.utcnow().isoformat()
-        vps['restored_from'] = snapshot_id
+        vps['restored_from'] = record['data'].get('snapshot_id')
         self.save_vps_data()
+        return 'rolled_forward'
 
-        return True
+    async def _recover_upgrade_vps(self, hostname: str, record: Dict[str, Any]) -> str:
+        vps = self.get_vps_by_hostname(hostname)
+        target = record['data'].get('to_plane')
+        if not vps or target not in self.planes:
+            return 'abandoned'
+        # Limits may be half-applied even if the plane was recorded; re-apply all of them
+        await self._upgrade(vps, target)
+        return 'rolled_forward'
+
+    async def _recover_delete_vps(self, hostname: str, record: Dict[str, Any]) -> str:
+        vps = self.get_vps_by_hostname(hostname)
+        if not vps:
+            return 'abandoned'
+        if not vps.get('deleted', False):
+            await self._remove_container_quietly(vps['container_name'])
+            vps['deleted'] = True
+            vps['deleted_at'] = datetime.utcnow().isoformat()
+            self.ports.release(hostname)
+            self.save_vps_data()
+        return 'rolled_forward'
+
+    @instrumented('reconcile')
+    async def reconcile(self) -> Dict[str, int]:
+        """Sync recorded status with what Docker actually reports (background job)"""
+        containers = await self._docker(
+            'containers.list',
+            self.client.containers.list, all=True, filters={"label": "vps.hostname"}
+        )
+        actual = {c.labels.get('vps.hostname'): c.status for c in containers}
+
+        changed = missing = 0
+        for hostname, vps in self.vps_instances.items():
+            # Never race an in-flight lifecycle operation
+            if vps.get('deleted', False) or self.is_busy(hostname):
+                continue
+            state = actual.get(hostname)
+            if state is None:
+                missing += 1
+                status = 'missing'
+            else:
+                status = 'running' if state in ('running', 'restarting') else 'stopped'
+            if vps.get('status') != status:
+                vps['status'] = status
+                changed += 1
+
+        if changed:
+            self.save_vps_data()
+        return {"checked": len(actual), "changed": changed, "missing": missing}
 
     def get_all_vps_stats(self) -> Dict[str, Any]:
         """Get stats for all VPS instances (for admin monitoring)"""